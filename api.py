@@ -8,8 +8,6 @@ For Railway: uvicorn api:app --host 0.0.0.0 --port ${PORT:-8000}
 from __future__ import annotations
 
 import os
-import threading
-import uuid
 from pathlib import Path
 
 _root = Path(__file__).resolve().parent
@@ -26,24 +24,63 @@ except ImportError:
                 if k.strip():
                     os.environ.setdefault(k.strip(), v.strip())
 
-import tempfile
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, JSONResponse
 from pydantic import BaseModel
 
 # Import after dotenv
-from pipeline import _fetch_new, _get_unprocessed, _process_one, run_seed_and_process_all, upsert_seed_links
+import db
+import jobs
+from pipeline import _fetch_new, _get_unprocessed, _process_one, process_many, upsert_seed_links
 
 app = FastAPI(title="Operators Vault Pipeline API", version="1.0.0")
 
-# In-memory job store for async /sync and /process-new (202). Lost on restart.
-_jobs: dict[str, dict] = {}
-_jobs_lock = threading.Lock()
+
+# Background Meilisearch syncer draining search_outbox (OUTBOX_SYNC=0 disables it, e.g. on extra replicas).
+_outbox_syncer = None
+# Worker threads draining pipeline_jobs (JOB_WORKER=0 disables them, e.g. for an API-only replica).
+_job_worker = None
+
+
+def _env_off(name: str) -> bool:
+    return os.environ.get(name, "1").strip().lower() in ("0", "false", "no", "off")
+
+
+@app.on_event("startup")
+def _start_outbox_syncer():
+    global _outbox_syncer
+    from search_index import OutboxSyncer, get_client
+
+    if _env_off("OUTBOX_SYNC"):
+        return
+    if os.environ.get("DATABASE_URL") and get_client() is not None:
+        _outbox_syncer = OutboxSyncer()
+        _outbox_syncer.start()
+
+
+@app.on_event("startup")
+def _start_job_worker():
+    global _job_worker
+    if _env_off("JOB_WORKER") or not os.environ.get("DATABASE_URL"):
+        return
+    _job_worker = jobs.Worker()
+    _job_worker.start()
+
+
+@app.on_event("shutdown")
+def _close_db_pool():
+    if _job_worker is not None:
+        _job_worker.stop()
+    if _outbox_syncer is not None:
+        _outbox_syncer.stop()
+    db.close_pool()
 
 
 class ProcessRequest(BaseModel):
     video_id: str
     podcast: str = "9operators"
+    restart: bool = False
 
 
 class SeedLinkEntry(BaseModel):
@@ -58,126 +95,126 @@ class SeedLinksRequest(BaseModel):
     links: list[SeedLinkEntry]
 
 
+class ReextractRequest(BaseModel):
+    video_ids: list[str] | None = None
+
+
+class ReindexRequest(BaseModel):
+    batch_size: int | None = None
+
+
 @app.post("/process")
 def process(req: ProcessRequest):
-    """Run the pipeline for one video: audio -> transcribe -> extract -> store."""
-    ok = _process_one(req.video_id, req.podcast)
+    """Run the pipeline for one video: audio -> transcribe -> extract -> store. Resumes after the video's last checkpoint unless restart."""
+    ok = _process_one(req.video_id, req.podcast, restart=req.restart)
     if not ok:
         raise HTTPException(status_code=500, detail="Processing failed")
     return {"ok": True, "video_id": req.video_id, "podcast": req.podcast}
 
 
-def _do_upsert_seed_links(rows: list[dict]) -> int:
-    """Upsert rows into seed_links. Returns count. Raises on no DATABASE_URL."""
-    import psycopg2
+def _do_upsert_seed_links(rows) -> dict[str, int]:
+    """Upsert rows (any iterable) into seed_links in batches. Returns {upserted, inserted, updated, unchanged}. Raises on no DATABASE_URL."""
     db_url = os.environ.get("DATABASE_URL")
     if not db_url:
         raise HTTPException(status_code=500, detail="DATABASE_URL not set")
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    try:
-        n = upsert_seed_links(cur, rows)
+    with db.connection() as conn, conn.cursor() as cur:
+        counts = upsert_seed_links(cur, rows)
         conn.commit()
-        return n
-    finally:
-        cur.close()
-        conn.close()
+        return counts
 
 
 @app.post("/seed-links")
 def seed_links(req: SeedLinksRequest):
     """Upsert links into seed_links (Supabase). Body: { \"links\": [ {\"video_id\", \"podcast\", \"title?\", \"duration_seconds?\", \"url?\"} ] }. Does not run backfill."""
     rows = [e.model_dump() for e in req.links]
-    n = _do_upsert_seed_links(rows)
-    return {"ok": True, "upserted": n}
+    return {"ok": True, **_do_upsert_seed_links(rows)}
+
+
+SEED_CSV_FIELDS = ("9operators", "marketing_operator", "finance_operators")
+
+
+def _has_content(upload) -> bool:
+    """True unless the upload is empty (UploadFile.size, or a one-byte peek when the size is unknown)."""
+    size = getattr(upload, "size", None)
+    if size is not None:
+        return size > 0
+    head = upload.file.read(1)
+    upload.file.seek(0)
+    return bool(head)
+
+
+async def _upsert_seed_csv_uploads(request: Request) -> dict[str, int] | None:
+    """
+    Stream the uploaded CSVs (form fields SEED_CSV_FIELDS) straight from the upload files into seed_links:
+    rows are parsed and deduped by video_id across files as they are read and upserted in batches, so nothing
+    is loaded whole or copied to a temp dir. Returns upsert counts, or None if no CSV was uploaded.
+    """
+    from youtube_client import iter_csv_stream
+
+    async with request.form() as form:
+        files = {}
+        for key in SEED_CSV_FIELDS:
+            f = form.get(key)
+            if f is None or not hasattr(f, "file") or not _has_content(f):
+                continue  # empty uploads are ignored, as if the field were absent
+            files[key] = f.file
+        if not files:
+            return None
+        seen: set[str] = set()
+        rows = (r for pod, f in files.items() for r in iter_csv_stream(f, podcast=pod, seen=seen))
+        # Parsing and the DB writes are blocking: keep them off the event loop.
+        return await run_in_threadpool(_do_upsert_seed_links, rows)
 
 
 @app.post("/seed-links/csv")
 async def seed_links_csv(request: Request):
     """
     Upload CSVs into seed_links. Multipart form: 9operators, marketing_operator, finance_operators (file fields).
-    Does not run backfill. Returns {ok, upserted}.
+    Does not run backfill. Returns {ok, upserted, inserted, updated, unchanged}.
     """
-    from youtube_client import load_all_seed_csvs
-    form = await request.form()
-    tmpdir = Path(tempfile.mkdtemp(prefix="seed_links_csv_"))
-    paths: dict[str, str] = {}
-    for key in ("9operators", "marketing_operator", "finance_operators"):
-        f = form.get(key)
-        if f is not None and hasattr(f, "read"):
-            raw = await f.read()
-            if not isinstance(raw, bytes):
-                raw = (raw or "").encode("utf-8", errors="replace")
-            if raw:
-                p = tmpdir / f"{key}.csv"
-                p.write_bytes(raw)
-                paths[key] = str(p)
-    if not paths:
+    counts = await _upsert_seed_csv_uploads(request)
+    if counts is None:
         raise HTTPException(status_code=400, detail="Upload at least one CSV: 9operators, marketing_operator, finance_operators")
-    rows = load_all_seed_csvs(paths=paths)
-    n = _do_upsert_seed_links(rows)
-    return {"ok": True, "upserted": n}
+    return {"ok": True, **counts}
 
 
 def _do_fetch_new() -> dict:
-    """Fetch new from YouTube; returns {ok, upserted}. Raises HTTPException on env/error."""
+    """Fetch new from YouTube; returns {ok, upserted, inserted, updated, unchanged}. Raises HTTPException on env/error."""
     db_url = os.environ.get("DATABASE_URL")
     if not db_url:
         raise HTTPException(status_code=500, detail="DATABASE_URL not set")
     if not os.environ.get("YOUTUBE_API_KEY"):
         raise HTTPException(status_code=500, detail="YOUTUBE_API_KEY not set")
-    import psycopg2
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    try:
-        n = _fetch_new(cur)
+    with db.connection() as conn, conn.cursor() as cur:
+        counts = _fetch_new(cur)
         conn.commit()
-        return {"ok": True, "upserted": n}
-    finally:
-        cur.close()
-        conn.close()
+        return {"ok": True, **counts}
 
 
 def _do_sync() -> dict:
-    """Run fetch-new then process-new. Returns {ok, upserted, processed, video_ids}. Raises on env/error."""
+    """Run fetch-new then process-new (PIPELINE_CONCURRENCY workers). Returns {ok, upserted, inserted, updated, unchanged, processed, failed, video_ids, failed_ids}. Raises on env/error."""
     db_url = os.environ.get("DATABASE_URL")
     if not db_url:
         raise HTTPException(status_code=500, detail="DATABASE_URL not set")
     if not os.environ.get("YOUTUBE_API_KEY"):
         raise HTTPException(status_code=500, detail="YOUTUBE_API_KEY not set")
-    import psycopg2
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    upserted = _fetch_new(cur)
-    conn.commit()
-    rows = _get_unprocessed(cur)
-    cur.close()
-    conn.close()
-    processed = []
-    for vid, pod in rows:
-        ok = _process_one(vid, pod)
-        if ok:
-            processed.append(vid)
-    return {"ok": True, "upserted": upserted, "processed": len(processed), "video_ids": processed}
+    with db.connection() as conn, conn.cursor() as cur:
+        counts = _fetch_new(cur)
+        conn.commit()
+        rows = _get_unprocessed(cur)
+    out = process_many(rows)
+    return {"ok": True, **counts, **out}
 
 
 def _do_process_new() -> dict:
-    """Process all unprocessed videos. Returns {ok, processed, video_ids}. Raises on env/error."""
+    """Process all unprocessed videos (PIPELINE_CONCURRENCY workers). Returns {ok, processed, failed, video_ids, failed_ids}. Raises on env/error."""
     db_url = os.environ.get("DATABASE_URL")
     if not db_url:
         raise HTTPException(status_code=500, detail="DATABASE_URL not set")
-    import psycopg2
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    rows = _get_unprocessed(cur)
-    cur.close()
-    conn.close()
-    processed = []
-    for vid, pod in rows:
-        ok = _process_one(vid, pod)
-        if ok:
-            processed.append(vid)
-    return {"ok": True, "processed": len(processed), "video_ids": processed}
+    with db.connection() as conn, conn.cursor() as cur:
+        rows = _get_unprocessed(cur)
+    out = process_many(rows)
+    return {"ok": True, **out}
 
 
 @app.post("/fetch-new")
@@ -202,9 +239,8 @@ def health():
         checks["database"] = "missing"
     else:
         try:
-            import psycopg2
-            conn = psycopg2.connect(db_url)
-            conn.close()
+            with db.connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1")
             checks["database"] = "ok"
         except Exception as e:
             checks["database"] = f"error: {e!s}"
@@ -227,7 +263,25 @@ def health():
             checks["meilisearch"] = f"error: {e!s}"
 
     status = "ok" if all(v == "ok" for v in checks.values()) else "degraded"
-    return {"status": status, "checks": checks}
+    from llm_cache import cache_stats
+    from search_index import outbox_stats
+
+    outbox: dict = {"syncer": _outbox_syncer.stats() if _outbox_syncer is not None else None}
+    job_queue: dict = {"worker": _job_worker.stats() if _job_worker is not None else None}
+    if checks["database"] == "ok":
+        try:
+            outbox.update(outbox_stats())
+            job_queue["by_status"] = jobs.queue_stats()
+        except Exception as e:
+            outbox["error"] = job_queue["error"] = str(e)
+    return {
+        "status": status,
+        "checks": checks,
+        "llm_cache": cache_stats(),
+        "db_pool": db.pool_stats(),
+        "search_outbox": outbox,
+        "jobs": job_queue,
+    }
 
 
 @app.get("/search")
@@ -246,7 +300,8 @@ def search(
         raise HTTPException(status_code=503, detail="MEILISEARCH_HOST or MEILISEARCH_API_KEY not set")
     try:
         from meilisearch import Client as MeiliClient
-        idx = MeiliClient(ms_host, ms_key).index("operators_insights")
+        from search_index import INDEX_NAME
+        idx = MeiliClient(ms_host, ms_key).index(INDEX_NAME)
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Meilisearch: {e!s}")
 
@@ -339,105 +394,82 @@ def sync():
     return _do_sync()
 
 
-def _run_async_job(job_id: str, fn, job_type: str):
-    """Run fn() in a background thread; store result or error in _jobs[job_id]."""
-    def run():
-        try:
-            out = fn()
-            with _jobs_lock:
-                _jobs[job_id]["status"] = "done"
-                _jobs[job_id]["result"] = out
-        except HTTPException as e:
-            with _jobs_lock:
-                _jobs[job_id]["status"] = "error"
-                _jobs[job_id]["error"] = f"{e.status_code}: {e.detail}"
-        except Exception as e:
-            with _jobs_lock:
-                _jobs[job_id]["status"] = "error"
-                _jobs[job_id]["error"] = str(e)
-
-    with _jobs_lock:
-        _jobs[job_id] = {"status": "running", "type": job_type, "result": None, "error": None}
-    t = threading.Thread(target=run, daemon=True)
-    t.start()
+def _enqueue_job(job_type: str, **kwargs) -> JSONResponse:
+    """Queue a pipeline_jobs row for the workers; 202 with job_id. Raises on missing DATABASE_URL."""
+    if not os.environ.get("DATABASE_URL"):
+        raise HTTPException(status_code=500, detail="DATABASE_URL not set")
+    job_id = jobs.submit(job_type, **kwargs)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued", "jobs": f"/jobs/{job_id}"})
 
 
 @app.post("/sync/async")
 def sync_async():
-    """Like POST /sync but returns 202 Accepted with job_id. Poll GET /jobs/{job_id} for status. Good when sync is slow."""
-    job_id = str(uuid.uuid4())
-    _run_async_job(job_id, _do_sync, "sync")
-    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "running", "jobs": f"/jobs/{job_id}"})
+    """Like POST /sync but queued: returns 202 with job_id; workers fetch new videos and process each as a child job. Poll GET /jobs/{job_id}."""
+    if not os.environ.get("YOUTUBE_API_KEY"):
+        raise HTTPException(status_code=500, detail="YOUTUBE_API_KEY not set")
+    return _enqueue_job("sync")
 
 
 @app.post("/process-new/async")
 def process_new_async():
-    """Like POST /process-new but returns 202 Accepted with job_id. Poll GET /jobs/{job_id} for status."""
-    job_id = str(uuid.uuid4())
-    _run_async_job(job_id, _do_process_new, "process-new")
-    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "running", "jobs": f"/jobs/{job_id}"})
+    """Like POST /process-new but queued: returns 202 with job_id. Poll GET /jobs/{job_id} for status."""
+    return _enqueue_job("process-new")
+
+
+@app.post("/reextract")
+def reextract(req: ReextractRequest):
+    """
+    Re-run chunking + insight extraction from stored transcripts (no download/transcribe), e.g. after prompt changes.
+    Body: { "video_ids": [...] } or { "video_ids": null } for every transcribed video. Returns 202 + job_id.
+    """
+    return _enqueue_job("reextract", payload={"video_ids": req.video_ids})
+
+
+@app.post("/reindex")
+def reindex(req: ReindexRequest | None = None):
+    """
+    Rebuild the Meilisearch index from the insights table into a temporary index and swap it in atomically;
+    search keeps working meanwhile. Body (optional): { "batch_size": 1000 }. Returns 202 + job_id; progress in GET /jobs/{job_id}.
+    """
+    from search_index import get_client
+
+    if get_client() is None:
+        raise HTTPException(status_code=503, detail="MEILISEARCH_HOST or MEILISEARCH_API_KEY not set")
+    return _enqueue_job("reindex", payload={"batch_size": req.batch_size if req else None})
 
 
 @app.post("/backfill")
 async def backfill(request: Request):
     """
     Run backfill from seed_links (Supabase): seed into videos then process unprocessed.
-    - With form files (9operators, marketing_operator, finance_operators): parse CSVs, upsert into seed_links, then run.
+    - With form files (9operators, marketing_operator, finance_operators): parse CSVs and upsert into seed_links first.
     - With no files: run from existing seed_links. Use POST /seed-links or /seed-links/csv first to store links.
     Returns 202 + job_id; poll GET /jobs/{job_id}.
     """
-    from youtube_client import load_all_seed_csvs
-
-    form = await request.form()
-    tmpdir = Path(tempfile.mkdtemp(prefix="backfill_"))
-    paths: dict[str, str] = {}
-    for key in ("9operators", "marketing_operator", "finance_operators"):
-        f = form.get(key)
-        if f is not None and hasattr(f, "read"):
-            raw = await f.read()
-            if not isinstance(raw, bytes):
-                raw = (raw or "").encode("utf-8", errors="replace")
-            if raw:
-                p = tmpdir / f"{key}.csv"
-                p.write_bytes(raw)
-                paths[key] = str(p)
-
-    job_id = str(uuid.uuid4())
-
-    def run():
-        try:
-            if paths:
-                rows = load_all_seed_csvs(paths=paths)
-                out = run_seed_and_process_all(seed_link_rows=rows)
-            else:
-                out = run_seed_and_process_all(from_db=True)
-            with _jobs_lock:
-                _jobs[job_id]["status"] = "done"
-                _jobs[job_id]["result"] = {"ok": True, **out}
-        except Exception as e:
-            with _jobs_lock:
-                _jobs[job_id]["status"] = "error"
-                _jobs[job_id]["error"] = str(e)
+    await _upsert_seed_csv_uploads(request)
+    return _enqueue_job("backfill")
+
 
-    with _jobs_lock:
-        _jobs[job_id] = {"status": "running", "type": "backfill", "result": None, "error": None}
-    threading.Thread(target=run, daemon=True).start()
-    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "running", "jobs": f"/jobs/{job_id}"})
+@app.get("/jobs")
+def list_jobs(status: str | None = None, limit: int = 50):
+    """Recent top-level jobs, newest first. Params: status (queued | running | waiting | done | error), limit (max 500)."""
+    if not os.environ.get("DATABASE_URL"):
+        raise HTTPException(status_code=500, detail="DATABASE_URL not set")
+    return {"jobs": jobs.list_jobs(status=status, limit=limit)}
 
 
 @app.get("/jobs/{job_id}")
 def get_job(job_id: str):
-    """Status of an async job (sync/async, process-new/async, backfill). status: running | done | error."""
-    with _jobs_lock:
-        j = _jobs.get(job_id)
+    """
+    Status of a queued job (sync/async, process-new/async, backfill, reextract, reindex) from pipeline_jobs.
+    status: queued | running | waiting (children still running) | done | error. Parents list child counts by status.
+    """
+    if not os.environ.get("DATABASE_URL"):
+        raise HTTPException(status_code=500, detail="DATABASE_URL not set")
+    j = jobs.get_job(job_id)
     if not j:
         raise HTTPException(status_code=404, detail="Job not found")
-    out = {"job_id": job_id, "status": j["status"], "type": j.get("type")}
-    if j.get("result") is not None:
-        out["result"] = j["result"]
-    if j.get("error") is not None:
-        out["error"] = j["error"]
-    return out
+    return j
 
 
 @app.get("/")
@@ -453,5 +485,7 @@ def root():
         "process_new_async": "POST /process-new/async (202 + job)",
         "seed_links": "POST /seed-links (JSON), POST /seed-links/csv (multipart) — store links in Supabase seed_links",
         "backfill": "POST /backfill (optional multipart CSVs; or none to run from seed_links in DB; 202 + job)",
-        "jobs": "GET /jobs/{job_id}",
+        "reextract": "POST /reextract {video_ids?} — rerun insight extraction from stored transcripts (202 + job)",
+        "reindex": "POST /reindex {batch_size?} — rebuild the Meilisearch index from Postgres with an atomic swap (202 + job)",
+        "jobs": "GET /jobs, GET /jobs/{job_id} (queued jobs in pipeline_jobs)",
     }
@@ -1,12 +1,40 @@
 """
 Download audio from YouTube via yt-dlp. Reusable as-is for Operators Vault.
+Downloaded files double as a size-bounded cache keyed by video_id: a valid existing file is reused instead of
+re-downloading, and least-recently-used files are evicted once the cache exceeds AUDIO_CACHE_MAX_MB.
+With AUDIO_CACHE=0, callers delete the file after a successful transcription (release_audio).
+stream_audio yields the audio from yt-dlp's stdout instead, for zero-disk uploads (deepgram_client.transcribe_stream).
+transcode_for_speech (and stream_audio(transcode=True)) shrink audio to mono Opus before upload.
 """
 from __future__ import annotations
 
 import os
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
+from typing import Iterator
+
+AUDIO_EXTS = (".webm", ".m4a", ".mp3")
+# Anything smaller is a truncated or failed download.
+MIN_AUDIO_BYTES = 64 * 1024
+# Allowed gap between probed and expected duration (seconds) before a cached file is considered invalid.
+DURATION_TOLERANCE_SEC = 30
+
+# Files downloaded but not yet released by this process; never evicted.
+_pinned: set[Path] = set()
+_pinned_lock = threading.Lock()
+
+
+def audio_cache_enabled() -> bool:
+    return os.environ.get("AUDIO_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def audio_cache_max_bytes() -> int:
+    try:
+        return int(float(os.environ.get("AUDIO_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+    except ValueError:
+        return 2048 * 1024 * 1024
 
 
 def get_audio_path(video_id: str, work_dir: str | Path | None = None) -> Path:
@@ -14,20 +42,119 @@ def get_audio_path(video_id: str, work_dir: str | Path | None = None) -> Path:
     work_dir = Path(work_dir or tempfile.gettempdir())
     work_dir.mkdir(parents=True, exist_ok=True)
     # yt-dlp often uses .webm or .m4a; we'll check both
-    for ext in (".webm", ".m4a", ".mp3"):
+    for ext in AUDIO_EXTS:
         p = work_dir / f"{video_id}.audio{ext}"
         if p.exists():
             return p
     return work_dir / f"{video_id}.audio.webm"
 
 
-def download_audio(video_id: str, work_dir: str | Path | None = None) -> Path | None:
+def probe_duration(path: str | Path) -> float | None:
+    """Duration in seconds via ffprobe, or None if ffprobe is missing or the file is unreadable."""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        str(path),
+    ]
+    try:
+        r = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=60)
+        return float(r.stdout.strip())
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired, ValueError):
+        return None
+
+
+def _valid_audio(path: Path, expected_duration: float | None = None) -> bool:
+    """Size check, plus a duration check against expected_duration when both it and ffprobe are available."""
+    try:
+        if path.stat().st_size < MIN_AUDIO_BYTES:
+            return False
+    except OSError:
+        return False
+    if expected_duration:
+        dur = probe_duration(path)
+        if dur is not None and abs(dur - float(expected_duration)) > DURATION_TOLERANCE_SEC:
+            return False
+    return True
+
+
+def find_cached_audio(video_id: str, work_dir: str | Path, expected_duration: float | None = None) -> Path | None:
+    """Existing valid audio for video_id in work_dir (marked as recently used), else None. Invalid files are removed."""
+    work_dir = Path(work_dir)
+    for ext in AUDIO_EXTS:
+        p = work_dir / f"{video_id}.audio{ext}"
+        if not p.exists():
+            continue
+        if _valid_audio(p, expected_duration):
+            os.utime(p)
+            return p
+        p.unlink(missing_ok=True)
+    return None
+
+
+def evict_audio_cache(cache_root: str | Path, max_bytes: int | None = None) -> int:
+    """
+    Delete least-recently-used *.audio.* files under cache_root (and its per-video subdirs) until the total is
+    within max_bytes (default AUDIO_CACHE_MAX_MB). Files still pinned by this process are kept. Returns bytes freed.
+    """
+    root = Path(cache_root)
+    max_bytes = audio_cache_max_bytes() if max_bytes is None else max_bytes
+    files = []
+    for p in list(root.glob("*.audio.*")) + list(root.glob("*/*.audio.*")):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        if p.is_file():
+            files.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in files)
+    freed = 0
+    with _pinned_lock:
+        pinned = set(_pinned)
+    for _, size, p in sorted(files, key=lambda f: f[0]):
+        if total <= max_bytes:
+            break
+        if p in pinned:
+            continue
+        p.unlink(missing_ok=True)
+        total -= size
+        freed += size
+    return freed
+
+
+def release_audio(path: str | Path | None, *, delete: bool | None = None) -> None:
+    """Unpin a file from download_audio once it is transcribed; deletes it when caching is off (or delete=True)."""
+    if not path:
+        return
+    p = Path(path)
+    with _pinned_lock:
+        _pinned.discard(p)
+    if delete if delete is not None else not audio_cache_enabled():
+        p.unlink(missing_ok=True)
+
+
+def download_audio(
+    video_id: str,
+    work_dir: str | Path | None = None,
+    *,
+    cache_root: str | Path | None = None,
+    expected_duration: float | None = None,
+) -> Path | None:
     """
     Download audio for a YouTube video. Uses yt-dlp.
+    Reuses a valid cached file in work_dir when caching is on; after a fresh download, evicts LRU audio under
+    cache_root (default work_dir) beyond the byte budget. The returned file is pinned until release_audio.
     Returns path to the audio file, or None on failure.
     """
     work_dir = Path(work_dir or tempfile.gettempdir())
     work_dir.mkdir(parents=True, exist_ok=True)
+    if audio_cache_enabled():
+        cached = find_cached_audio(video_id, work_dir, expected_duration)
+        if cached:
+            print(f"  [audio] cache hit {cached.name}", flush=True)
+            with _pinned_lock:
+                _pinned.add(cached)
+            return cached
     url = f"https://www.youtube.com/watch?v={video_id}"
     out_tpl = str(work_dir / f"{video_id}.audio.%(ext)s")
     cmd = [
@@ -44,10 +171,123 @@ def download_audio(video_id: str, work_dir: str | Path | None = None) -> Path |
     try:
         subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=600)
     except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+        for p in work_dir.glob(f"{video_id}.audio.*.part"):
+            p.unlink(missing_ok=True)
         return None
     # find the file (ext can vary)
-    for ext in (".webm", ".m4a", ".mp3"):
+    for ext in AUDIO_EXTS:
         p = work_dir / f"{video_id}.audio{ext}"
         if p.exists():
+            with _pinned_lock:
+                _pinned.add(p)
+            if audio_cache_enabled():
+                evict_audio_cache(cache_root or work_dir)
             return p
     return None
+
+
+# Speech-optimized encoding for upload: mono Opus at TRANSCODE_BITRATE (default 32k), 16 kHz.
+TRANSCODE_BITRATE = os.environ.get("TRANSCODE_BITRATE", "32k")
+_TRANSCODE_ARGS = ["-vn", "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-application", "voip", "-f", "ogg"]
+
+
+def transcode_for_speech(path: str | Path, *, bitrate: str | None = None) -> tuple[Path, dict] | None:
+    """
+    Re-encode audio to low-bitrate mono Opus (work_dir/<stem>.speech.ogg) for a smaller Deepgram upload.
+    Returns (new_path, stats) with original_bytes, compressed_bytes, saved_bytes, ratio and est_upload_saved_sec
+    (at UPLOAD_MBPS, default 20 Mbit/s), or None if ffmpeg is missing or fails. Caller deletes new_path when done.
+    """
+    src = Path(path)
+    out = src.with_name(src.name.split(".audio")[0] + ".speech.ogg")
+    cmd = ["ffmpeg", "-y", "-nostdin", "-loglevel", "error", "-i", str(src), *_TRANSCODE_ARGS,
+           "-b:a", bitrate or TRANSCODE_BITRATE, str(out)]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=1800)
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+        out.unlink(missing_ok=True)
+        return None
+    try:
+        before, after = src.stat().st_size, out.stat().st_size
+    except OSError:
+        return None
+    if after <= 0:
+        out.unlink(missing_ok=True)
+        return None
+    try:
+        mbps = float(os.environ.get("UPLOAD_MBPS", "20"))
+    except ValueError:
+        mbps = 20.0
+    saved = before - after
+    stats = {
+        "original_bytes": before,
+        "compressed_bytes": after,
+        "saved_bytes": saved,
+        "ratio": round(after / before, 3) if before else None,
+        "est_upload_saved_sec": round(saved * 8 / (mbps * 1_000_000), 1) if mbps > 0 else None,
+    }
+    return out, stats
+
+
+# Read size for stream_audio; memory per stream stays around this plus the HTTP client's buffer.
+STREAM_CHUNK_BYTES = 256 * 1024
+
+
+class StreamError(RuntimeError):
+    """yt-dlp exited with an error while streaming; the partial upload must be discarded."""
+
+
+def stream_audio(
+    video_id: str,
+    *,
+    chunk_bytes: int = STREAM_CHUNK_BYTES,
+    timeout: int = 600,
+    transcode: bool = False,
+) -> Iterator[bytes]:
+    """
+    Yield bestaudio bytes for a YouTube video straight from yt-dlp's stdout (no temp file).
+    With transcode, pipes through ffmpeg first and yields speech-optimized Ogg/Opus (see transcode_for_speech).
+    Raises StreamError at the end if yt-dlp (or ffmpeg) fails, so a consumer uploading the chunks aborts instead
+    of sending truncated audio. Closing the generator early terminates the subprocesses.
+    """
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    cmd = [
+        "yt-dlp",
+        "-f", "bestaudio[ext=webm]/bestaudio[ext=m4a]/bestaudio",
+        "-o", "-",
+        "--no-playlist",
+        "--no-warnings",
+        "--quiet",
+        url,
+    ]
+    procs: list[subprocess.Popen] = []
+    try:
+        procs.append(subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+        if transcode:
+            ff = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0", *_TRANSCODE_ARGS,
+                  "-b:a", TRANSCODE_BITRATE, "pipe:1"]
+            procs.append(subprocess.Popen(ff, stdin=procs[0].stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+            procs[0].stdout.close()  # ffmpeg owns the pipe now; yt-dlp gets SIGPIPE if ffmpeg dies
+    except FileNotFoundError as e:
+        for p in procs:
+            p.kill()
+        raise StreamError(f"{e.filename or 'yt-dlp/ffmpeg'} not found") from e
+    timer = threading.Timer(timeout, lambda: [p.kill() for p in procs])
+    timer.start()
+    try:
+        out = procs[-1].stdout
+        assert out is not None
+        while True:
+            chunk = out.read(chunk_bytes)
+            if not chunk:
+                break
+            yield chunk
+        for p, name in zip(procs, ("yt-dlp", "ffmpeg")):
+            err = p.stderr.read().decode("utf-8", errors="replace") if p.stderr else ""
+            if p.wait() != 0:
+                raise StreamError(f"{name} exited {p.returncode}: {err.strip()[:500]}")
+    finally:
+        timer.cancel()
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+                p.wait()
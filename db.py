@@ -0,0 +1,301 @@
+"""
+Process-wide PostgreSQL connection pool shared by pipeline.py and api.py.
+Connections to DATABASE_URL are opened lazily and reused, so stages and API handlers skip the TLS + auth
+round trips of a fresh connect through the Supabase pooler.
+Size: DB_POOL_MIN (default 1) connections opened up front, DB_POOL_MAX (default 10) open at once. Every returned
+connection stays idle for reuse (up to DB_POOL_MAX), unlike psycopg2's ThreadedConnectionPool, which closes those
+beyond minconn. Callers beyond DB_POOL_MAX wait up to DB_POOL_TIMEOUT seconds (default 30) for a connection.
+Connections idle for more than DB_POOL_CHECK_IDLE_SEC (default 30) are pinged (SELECT 1) on checkout and replaced
+if the server or pooler dropped them.
+Bulk writers: insert_rows (multi-row INSERT ... VALUES pages), upsert_rows (the same with ON CONFLICT DO UPDATE,
+skipping unchanged rows) and copy_rows (COPY FROM STDIN), one round trip per page instead of per row.
+"""
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
+
+# Rows per multi-row INSERT statement in insert_rows.
+BULK_PAGE_SIZE = 1000
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class PoolTimeout(RuntimeError):
+    """No pooled connection became free within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Idle-connection stack plus a semaphore, so callers wait for a free connection instead of failing when all
+    DB_POOL_MAX are checked out. A connection is only opened when none is idle, so at most maxconn exist;
+    returned ones are kept (most recently used handed out first). Broken connections are discarded.
+    """
+
+    def __init__(self, dsn: str, *, minconn: int, maxconn: int, timeout: float, check_idle_sec: float = 30.0):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.check_idle_sec = check_idle_sec
+        self._idle: deque = deque()
+        # id(conn) -> monotonic time it was returned, for the idle liveness check.
+        self._returned_at: dict[int, float] = {}
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_sec = 0.0
+        self.discarded = 0
+        for _ in range(self.minconn):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        import psycopg2
+
+        return psycopg2.connect(self.dsn)
+
+    def _close(self, conn) -> None:
+        self._returned_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        t0 = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout if self.timeout > 0 else None):
+                raise PoolTimeout(f"no database connection free after {self.timeout:.0f}s (DB_POOL_MAX={self.maxconn})")
+        try:
+            # Stale idle connections are discarded one by one; a newly opened one has no idle time and isn't pinged.
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    conn = self._connect()
+                    break
+                if self._alive(conn):
+                    break
+                self._close(conn)
+                with self._lock:
+                    self.discarded += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_sec += time.monotonic() - t0
+        return conn
+
+    def _alive(self, conn) -> bool:
+        """False if conn is closed, or was idle longer than check_idle_sec and fails a SELECT 1."""
+        if conn.closed:
+            return False
+        returned = self._returned_at.get(id(conn))
+        if returned is None or self.check_idle_sec < 0 or time.monotonic() - returned <= self.check_idle_sec:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def putconn(self, conn, *, close: bool = False) -> None:
+        close = close or bool(conn.closed)
+        if not close:
+            try:
+                # Never hand the next caller an open transaction (or one aborted by an error).
+                conn.rollback()
+            except Exception:
+                close = True
+        if close:
+            self._close(conn)
+        else:
+            self._returned_at[id(conn)] = time.monotonic()
+        with self._lock:
+            self.in_use -= 1
+            if close:
+                self.discarded += 1
+            else:
+                self._idle.append(conn)
+        self._slots.release()
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": round(1000 * self.wait_sec / self.checkouts, 2) if self.checkouts else 0.0,
+                "discarded": self.discarded,
+            }
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool, created on first use. Raises ValueError if DATABASE_URL is not set."""
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            dsn = os.environ.get("DATABASE_URL")
+            if not dsn:
+                raise ValueError("DATABASE_URL not set")
+            try:
+                timeout = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+            except ValueError:
+                timeout = 30.0
+            try:
+                check_idle_sec = float(os.environ.get("DB_POOL_CHECK_IDLE_SEC", "30"))
+            except ValueError:
+                check_idle_sec = 30.0
+            _pool = ConnectionPool(
+                dsn,
+                minconn=_env_int("DB_POOL_MIN", 1),
+                maxconn=_env_int("DB_POOL_MAX", 10),
+                timeout=timeout,
+                check_idle_sec=check_idle_sec,
+            )
+        return _pool
+
+
+@contextmanager
+def connection() -> Iterator[Any]:
+    """
+    Borrow a pooled connection for the with-block. Commit inside the block; anything uncommitted is rolled
+    back on return. Connections that fail with a connection-level error are closed instead of reused.
+    """
+    import psycopg2
+
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
+
+def pool_stats() -> dict[str, Any] | None:
+    """Stats of the process-wide pool, or None if it has not been opened yet."""
+    p = _pool
+    return p.stats() if p is not None else None
+
+
+def close_pool() -> None:
+    """Close every pooled connection (e.g. on API shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def insert_rows(cur, table: str, columns: Iterable[str], rows: Iterable[tuple], *, page_size: int = BULK_PAGE_SIZE) -> int:
+    """
+    INSERT rows (tuples in `columns` order) as multi-row VALUES statements of page_size rows (execute_values).
+    Returns rows written. table/columns are trusted identifiers, not user input.
+    """
+    from psycopg2.extras import execute_values
+
+    rows = list(rows)
+    if not rows:
+        return 0
+    execute_values(cur, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows, page_size=page_size)
+    return len(rows)
+
+
+def upsert_rows(
+    cur,
+    table: str,
+    columns: Iterable[str],
+    rows: Iterable[tuple],
+    *,
+    conflict: str,
+    update: str,
+    where: str | None = None,
+    template: str | None = None,
+    page_size: int = BULK_PAGE_SIZE,
+) -> dict[str, int]:
+    """
+    Multi-row INSERT ... ON CONFLICT (conflict) DO UPDATE SET update [WHERE where], page_size rows per statement.
+    `where` should be an IS DISTINCT FROM guard so rows whose values would not change are left alone (no new
+    tuple version, WAL or index writes). Rows must be unique on the conflict key (Postgres rejects a statement
+    that updates one row twice). template overrides the per-row VALUES template (e.g. for casts).
+    Returns {"upserted": rows sent, "inserted", "updated", "unchanged"} (inserts told apart by xmax = 0).
+    """
+    from psycopg2.extras import execute_values
+
+    rows = list(rows)
+    counts = {"upserted": len(rows), "inserted": 0, "updated": 0, "unchanged": 0}
+    if not rows:
+        return counts
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s ON CONFLICT ({conflict}) DO UPDATE SET {update}"
+    if where:
+        sql += f" WHERE {where}"
+    written = execute_values(cur, sql + " RETURNING (xmax = 0)", rows, template=template, page_size=page_size, fetch=True)
+    counts["inserted"] = sum(1 for (ins,) in written if ins)
+    counts["updated"] = len(written) - counts["inserted"]
+    counts["unchanged"] = len(rows) - len(written)
+    return counts
+
+
+def count_summary(counts: dict[str, int]) -> str:
+    """'3 new, 1 updated, 116 unchanged' for upsert_rows-style counts."""
+    return f"{counts.get('inserted', 0)} new, {counts.get('updated', 0)} updated, {counts.get('unchanged', 0)} unchanged"
+
+
+def _copy_field(v: Any) -> str:
+    if v is None:
+        return "\\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_rows(cur, table: str, columns: Iterable[str], rows: Iterable[tuple]) -> int:
+    """
+    Append rows with COPY ... FROM STDIN (text format): the fastest path for large plain appends
+    (no RETURNING / ON CONFLICT). Returns rows written.
+    """
+    buf = io.StringIO()
+    n = 0
+    for row in rows:
+        buf.write("\t".join(_copy_field(v) for v in row))
+        buf.write("\n")
+        n += 1
+    if n:
+        buf.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+    return n
@@ -1,12 +1,21 @@
 """
 Transcribe audio via Deepgram with speaker diarization.
 Uses DEEPGRAM_API_KEY. punctuate=true, utterances=true for segments.
+Long files can be split at silences and transcribed in parallel (transcribe_split); the stitched response has
+the same shape for get_raw_text / get_utterances.
 """
 from __future__ import annotations
 
+import gzip
+import itertools
+import json
 import os
+import re
+import shutil
+import subprocess
+import tempfile
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
 try:
     from deepgram import Deepgram
@@ -54,6 +63,320 @@ def transcribe(
         return None
 
 
+DEFAULT_API_URL = "https://api.deepgram.com"
+
+
+def sniff_content_type(head: bytes, default: str = "application/octet-stream") -> str:
+    """Audio MIME type from a stream's first bytes (container magic), e.g. to label yt-dlp's bestaudio output."""
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "audio/webm"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head[4:8] == b"ftyp":
+        return "audio/mp4"
+    if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mpeg"
+    if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+    return default
+
+
+def transcribe_stream(
+    chunks: Iterable[bytes],
+    *,
+    api_key: str | None = None,
+    punctuate: bool = True,
+    utterances: bool = True,
+    diarize: bool = True,
+    model: str = "nova-2",
+    content_type: str | None = None,
+    base_url: str | None = None,
+    timeout: float = 900.0,
+) -> dict[str, Any] | None:
+    """
+    Transcribe audio from an iterable of byte chunks (e.g. audio_extractor.stream_audio) with a chunked HTTP
+    upload to Deepgram's /v1/listen, so the file is never on disk or fully in memory. Same options and response
+    shape as transcribe. content_type=None labels the upload from the first chunk's container (sniff_content_type),
+    so an m4a fallback from yt-dlp isn't sent as webm. base_url (or DEEPGRAM_API_URL) points at a different
+    server, e.g. a local fake receiver (scripts/check_stream_upload.py).
+    Returns None on failure, including an error raised by the chunk source mid-upload.
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    api_key = api_key or os.environ.get("DEEPGRAM_API_KEY")
+    if not api_key:
+        return None
+    url = (base_url or os.environ.get("DEEPGRAM_API_URL") or DEFAULT_API_URL).rstrip("/") + "/v1/listen"
+    params: dict[str, str] = {
+        "punctuate": str(punctuate).lower(),
+        "model": model,
+        "smart_format": "true",
+    }
+    if utterances:
+        params["utterances"] = "true"
+    if diarize:
+        params["diarize"] = "true"
+    try:
+        it = iter(chunks)
+        first = next(it, b"")
+        if not first:
+            return None
+        content_type = content_type or sniff_content_type(first[:16])
+        headers = {"Authorization": f"Token {api_key}", "Content-Type": content_type}
+        # A generator body is sent with Transfer-Encoding: chunked, one chunk at a time.
+        with httpx.Client(timeout=httpx.Timeout(timeout, connect=30.0)) as client:
+            r = client.post(url, params=params, headers=headers, content=itertools.chain((first,), it))
+        r.raise_for_status()
+        return r.json()
+    except Exception:
+        return None
+
+
+def _silence_midpoints(path: Path, *, noise_db: int = -35, min_silence_sec: float = 0.5) -> list[float]:
+    """Midpoints (seconds) of silences found by ffmpeg silencedetect; [] if ffmpeg is unavailable."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-i", str(path),
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence_sec}",
+        "-f", "null", "-",
+    ]
+    try:
+        r = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return []
+    starts = [float(x) for x in re.findall(r"silence_start: (-?[\d.]+)", r.stderr)]
+    ends = [float(x) for x in re.findall(r"silence_end: ([\d.]+)", r.stderr)]
+    return [(a + b) / 2 for a, b in zip(starts, ends)]
+
+
+def _split_points(duration: float, pieces: int, silences: list[float], max_shift_sec: float = 120.0) -> list[float]:
+    """Cut times for `pieces` roughly equal parts, each moved to the nearest silence within max_shift_sec."""
+    cuts: list[float] = []
+    for k in range(1, pieces):
+        target = duration * k / pieces
+        near = [s for s in silences if abs(s - target) <= max_shift_sec and (not cuts or s > cuts[-1])]
+        cuts.append(min(near, key=lambda s: abs(s - target)) if near else target)
+    return cuts
+
+
+# Seconds each split piece re-transcribes before its cut, so neighbouring pieces share audio to match speakers on.
+SPLIT_OVERLAP_SEC = 20.0
+# Shared speech (seconds) needed before two pieces' speakers are taken to be the same person.
+_MIN_SHARED_SEC = 1.0
+
+
+def _talk_time(utts: list[dict[str, Any]]) -> dict[int, float]:
+    talk: dict[int, float] = {}
+    for u in utts:
+        sp = u.get("speaker")
+        if sp is not None:
+            talk[sp] = talk.get(sp, 0.0) + float(u.get("end") or 0) - float(u.get("start") or 0)
+    return talk
+
+
+def _overlap_votes(
+    prev: list[dict[str, Any]], prev_off: float, prev_map: dict[int, int],
+    cur: list[dict[str, Any]], cur_off: float, lo: float, hi: float,
+) -> dict[tuple[int, int], float]:
+    """Seconds (within [lo, hi], episode time) that each (local speaker of cur, episode label of prev) talk at once."""
+    def spans(utts, off):
+        for u in utts:
+            if u.get("speaker") is None:
+                continue
+            a, b = max(lo, float(u.get("start") or 0) + off), min(hi, float(u.get("end") or 0) + off)
+            if b > a:
+                yield u["speaker"], a, b
+
+    votes: dict[tuple[int, int], float] = {}
+    prev_spans = [(prev_map.get(sp, sp), a, b) for sp, a, b in spans(prev, prev_off)]
+    for sp, a, b in spans(cur, cur_off):
+        for label, pa, pb in prev_spans:
+            shared = min(b, pb) - max(a, pa)
+            if shared > 0:
+                votes[(sp, label)] = votes.get((sp, label), 0.0) + shared
+    return votes
+
+
+def _reconcile_speakers(
+    pieces: list[list[dict[str, Any]]],
+    offsets: list[float] | None = None,
+    cuts: list[float] | None = None,
+) -> list[dict[int, int]]:
+    """
+    Map each piece's local diarization labels to episode-wide labels (diarization restarts per piece).
+    Piece k (from offsets[k], episode time) overlaps the previous piece up to cuts[k]: a speaker is given the
+    label of the previous piece's speaker they share the most overlap speech with (one-to-one, at least
+    _MIN_SHARED_SEC). Speakers with no overlap evidence fall back to talk-time rank against the labels still
+    free (logged), then to new labels.
+    """
+    offsets = offsets or [0.0] * len(pieces)
+    cuts = cuts or offsets
+    maps: list[dict[int, int]] = []
+    labels_talk: dict[int, float] = {}  # episode label -> talk time so far
+    for k, utts in enumerate(pieces):
+        talk = _talk_time(utts)
+        if k == 0:
+            maps.append({sp: sp for sp in talk})
+            labels_talk.update(talk)
+            continue
+        m: dict[int, int] = {}
+        if cuts[k] > offsets[k]:
+            votes = _overlap_votes(pieces[k - 1], offsets[k - 1], maps[k - 1], utts, offsets[k], offsets[k], cuts[k])
+            for (sp, label), shared in sorted(votes.items(), key=lambda kv: -kv[1]):
+                if shared >= _MIN_SHARED_SEC and sp not in m and label not in m.values():
+                    m[sp] = label
+        unmatched = sorted((sp for sp in talk if sp not in m), key=lambda sp: -talk[sp])
+        if unmatched:
+            free = sorted((lb for lb in labels_talk if lb not in m.values()), key=lambda lb: -labels_talk[lb])
+            ranked = unmatched[: len(free)]
+            for sp, label in zip(ranked, free):
+                m[sp] = label
+            next_label = max(labels_talk, default=-1) + 1
+            for sp in unmatched[len(free):]:
+                m[sp] = next_label
+                next_label += 1
+            if ranked:
+                reason = "no overlap with the previous piece" if cuts[k] <= offsets[k] else "no shared speech in the overlap"
+                print(
+                    f"  [split] piece {k}: speaker(s) {', '.join(map(str, ranked))} matched by talk-time rank ({reason})",
+                    flush=True,
+                )
+        for sp, t in talk.items():
+            labels_talk[m[sp]] = labels_talk.get(m[sp], 0.0) + t
+        maps.append(m)
+    return maps
+
+
+def _words_text(words: list[dict[str, Any]]) -> str:
+    return " ".join(w.get("punctuated_word") or w.get("word") or "" for w in words).strip()
+
+
+def stitch_responses(
+    responses: list[dict[str, Any]],
+    offsets: list[float],
+    cuts: list[float] | None = None,
+) -> dict[str, Any]:
+    """
+    Merge per-piece Deepgram responses into one: utterance/word times shifted by each piece's offset, speakers
+    reconciled across pieces, transcripts joined. cuts[k] (episode time, >= offsets[k]) is where piece k takes
+    over from piece k-1: its utterances and words starting earlier repeat the overlap and are dropped (default:
+    no overlap). An utterance of piece k that straddles the cut (piece k-1's audio ends mid-sentence when no
+    silence was near) is kept, trimmed to its words from the cut on. Shape matches a single prerecorded response.
+    """
+    cuts = cuts or offsets
+    piece_utts = [
+        (r.get("utterances") or (r.get("results") or {}).get("utterances") or []) for r in responses
+    ]
+    maps = _reconcile_speakers(piece_utts, offsets, cuts)
+    utterances: list[dict[str, Any]] = []
+    words: list[dict[str, Any]] = []
+    texts: list[str] = []
+    for r, utts, off, cut, sp_map in zip(responses, piece_utts, offsets, cuts, maps):
+        kept_text: list[str] = []
+        for u in utts:
+            u_words = u.get("words") or []
+            straddles = False
+            if float(u.get("start") or 0) + off < cut:
+                u_words = [w for w in u_words if float(w.get("start") or 0) + off >= cut]
+                if not u_words:
+                    continue
+                straddles = True
+            u = dict(u)
+            u["start"] = round(float(u.get("start") or 0) + off, 3)
+            u["end"] = round(float(u.get("end") or 0) + off, 3)
+            if u.get("speaker") is not None:
+                u["speaker"] = sp_map.get(u["speaker"], u["speaker"])
+            u["words"] = [
+                {**w, "start": round(float(w.get("start") or 0) + off, 3), "end": round(float(w.get("end") or 0) + off, 3),
+                 **({"speaker": sp_map.get(w["speaker"], w["speaker"])} if w.get("speaker") is not None else {})}
+                for w in u_words
+            ]
+            if straddles:
+                u["start"] = u["words"][0]["start"]
+                u["transcript"] = _words_text(u_words)
+            utterances.append(u)
+            kept_text.append((u.get("transcript") or "").strip())
+        try:
+            alt = r["results"]["channels"][0]["alternatives"][0]
+        except (KeyError, IndexError, TypeError):
+            alt = {}
+        kept_words = [w for w in alt.get("words") or [] if float(w.get("start") or 0) + off >= cut]
+        if cut <= off:
+            texts.append((alt.get("transcript") or "").strip())
+        elif kept_text:
+            texts.append(" ".join(t for t in kept_text if t))
+        else:
+            texts.append(_words_text(kept_words))
+        for w in kept_words:
+            words.append({**w, "start": round(float(w.get("start") or 0) + off, 3), "end": round(float(w.get("end") or 0) + off, 3)})
+    return {
+        "metadata": {"split_offsets": offsets, "split_cuts": cuts},
+        "results": {
+            "channels": [{"alternatives": [{"transcript": " ".join(t for t in texts if t), "words": words}]}],
+            "utterances": utterances,
+        },
+    }
+
+
+def transcribe_split(
+    audio_path: str | Path,
+    *,
+    pieces: int,
+    duration: float | None = None,
+    api_key: str | None = None,
+    punctuate: bool = True,
+    utterances: bool = True,
+    diarize: bool = True,
+    model: str = "nova-2",
+) -> dict[str, Any] | None:
+    """
+    Split audio into `pieces` parts at silence boundaries (ffmpeg), each overlapping the previous one by
+    SPLIT_OVERLAP_SEC, transcribe them concurrently and stitch the results (stitch_responses). duration defaults
+    to ffprobe. Returns None if ffmpeg/ffprobe are missing or any piece fails, so the caller can fall back to
+    transcribe().
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from audio_extractor import probe_duration
+
+    path = Path(audio_path)
+    duration = duration or probe_duration(path)
+    if not duration or pieces < 2:
+        return None
+    cuts = _split_points(duration, pieces, _silence_midpoints(path))
+    # Each piece after the first starts SPLIT_OVERLAP_SEC before its cut; the shared audio matches speakers.
+    starts = [0.0] + [max(0.0, c - SPLIT_OVERLAP_SEC) for c in cuts]
+    bounds = list(zip(starts, cuts + [None]))
+    tmp = Path(tempfile.mkdtemp(prefix=f"{path.name.split('.audio')[0]}.pieces.", dir=path.parent))
+    try:
+        files: list[Path] = []
+        for k, (start, end) in enumerate(bounds):
+            out = tmp / f"piece{k}{path.suffix}"
+            cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-ss", f"{start:.3f}"]
+            if end is not None:
+                cmd += ["-to", f"{end:.3f}"]
+            cmd += ["-i", str(path), "-vn", "-c", "copy", str(out)]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=600)
+            except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+                return None
+            files.append(out)
+
+        def one(f: Path) -> dict[str, Any] | None:
+            return transcribe(f, api_key=api_key, punctuate=punctuate, utterances=utterances, diarize=diarize, model=model)
+
+        with ThreadPoolExecutor(max_workers=len(files), thread_name_prefix="deepgram") as ex:
+            responses = list(ex.map(one, files))
+        if any(not r for r in responses):
+            return None
+        return stitch_responses(responses, starts, [0.0] + cuts)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
 def get_raw_text(res: dict[str, Any] | None) -> str:
     """Extract full transcript text from Deepgram response."""
     if not res:
@@ -74,7 +397,8 @@ def get_utterances(res: dict[str, Any] | None) -> list[dict[str, Any]]:
     """
     if not res:
         return []
-    u = res.get("utterances") or []
+    # SDK responses may carry utterances at the top level; the REST API nests them under results.
+    u = res.get("utterances") or (res.get("results") or {}).get("utterances") or []
     out: list[dict[str, Any]] = []
     for x in u:
         out.append({
@@ -84,3 +408,18 @@ def get_utterances(res: dict[str, Any] | None) -> list[dict[str, Any]]:
             "speaker": x.get("speaker"),
         })
     return out
+
+
+def dump_response(res: dict[str, Any] | None) -> bytes:
+    """Deepgram response -> gzip-compressed JSON bytes (for transcriptions.deepgram_json_gz)."""
+    return gzip.compress(json.dumps(res or {}, separators=(",", ":")).encode("utf-8"))
+
+
+def load_response(blob: bytes | memoryview | None) -> dict[str, Any] | None:
+    """Inverse of dump_response. Returns None for empty or unreadable data."""
+    if not blob:
+        return None
+    try:
+        return json.loads(gzip.decompress(bytes(blob)).decode("utf-8"))
+    except (OSError, ValueError):
+        return None
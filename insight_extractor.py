@@ -1,18 +1,43 @@
 """
 LLM-based insight extraction, title generation, timestamp extraction, and framework content.
 Uses Anthropic. Loads prompts from prompts/operators/ (or prompts/{prompt_set}/).
+Responses are memoized in llm_cache (LLM_CACHE=0 to bypass).
 """
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import json
 import os
 import re
+import threading
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Sequence
 
 PROMPTS_DIR = Path(__file__).resolve().parent / "prompts"
 DEFAULT_PROMPT_SET = "operators"
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Concurrency for run_llm_calls (LLM_CONCURRENCY), process-wide request rate cap (LLM_RPM, 0 = none),
+# and SDK retries on 429/5xx (LLM_MAX_RETRIES; the SDK honors retry-after with backoff).
+LLM_CONCURRENCY = _env_int("LLM_CONCURRENCY", 8)
+LLM_RPM = _env_int("LLM_RPM", 0)
+LLM_MAX_RETRIES = _env_int("LLM_MAX_RETRIES", 4)
+
+_client = None
+_client_lock = threading.Lock()
+_rate_lock = threading.Lock()
+_next_slot = 0.0
+
+
 def _load_prompt(name: str, prompt_set: str = DEFAULT_PROMPT_SET) -> str:
     p = PROMPTS_DIR / prompt_set / f"{name}.md"
     if not p.exists():
@@ -20,24 +45,91 @@ def _load_prompt(name: str, prompt_set: str = DEFAULT_PROMPT_SET) -> str:
     return p.read_text(encoding="utf-8") if p.exists() else ""
 
 
-def _anthropic_message(system: str, user: str, model: str = "claude-sonnet-4-20250514") -> str:
-    try:
-        import anthropic
-    except ImportError:
+def _get_client(api_key: str):
+    """One Anthropic client per process (thread-safe; reuses HTTP connections across calls and workers)."""
+    global _client
+    import anthropic
+
+    with _client_lock:
+        if _client is None or _client.api_key != api_key:
+            _client = anthropic.Anthropic(api_key=api_key, max_retries=LLM_MAX_RETRIES)
+        return _client
+
+
+def _throttle() -> None:
+    """Block until this thread may send a request under LLM_RPM (shared by all threads and event loops)."""
+    global _next_slot
+    if LLM_RPM <= 0:
+        return
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_slot)
+        _next_slot = slot + 60.0 / LLM_RPM
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def _anthropic_message(system: str, user: str, model: str = "claude-sonnet-4-20250514", max_tokens: int = 4096) -> str:
+    from llm_cache import cache_key, get_cache
+
+    cache = get_cache()
+    key = cache_key(model, system, user, max_tokens) if cache else ""
+    if cache:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    if importlib.util.find_spec("anthropic") is None:
         return ""
     api_key = os.environ.get("ANTHROPIC_API_KEY")
     if not api_key:
         return ""
-    c = anthropic.Anthropic(api_key=api_key)
+    c = _get_client(api_key)
+    _throttle()
     r = c.messages.create(
         model=model,
-        max_tokens=4096,
+        max_tokens=max_tokens,
         system=system,
         messages=[{"role": "user", "content": user}],
     )
+    text = ""
     if r.content and len(r.content) > 0 and hasattr(r.content[0], "text"):
-        return r.content[0].text
-    return ""
+        text = r.content[0].text
+    if cache and text and getattr(r, "stop_reason", None) != "max_tokens":
+        cache.put(key, text)
+    return text
+
+
+async def _gather_ordered(calls: Sequence[Callable[[], Any]], limit: int) -> list[Any]:
+    from concurrent.futures import ThreadPoolExecutor
+
+    sem = asyncio.Semaphore(max(1, limit))
+    loop = asyncio.get_running_loop()
+    # Own executor so `limit` is not capped by the loop's default thread count.
+    with ThreadPoolExecutor(max_workers=max(1, limit), thread_name_prefix="llm") as ex:
+
+        async def one(fn: Callable[[], Any]) -> Any:
+            async with sem:
+                return await loop.run_in_executor(ex, fn)
+
+        return await asyncio.gather(*(one(fn) for fn in calls), return_exceptions=True)
+
+
+def run_llm_calls(calls: Sequence[Callable[[], Any]], *, concurrency: int | None = None) -> list[Any]:
+    """
+    Run blocking LLM calls (zero-arg callables) concurrently, at most `concurrency` at a time (default LLM_CONCURRENCY).
+    Returns results in the order of calls. If any call raised, re-raises the first error after all have finished.
+    Safe to call from worker threads; each call gets its own event loop.
+    """
+    if not calls:
+        return []
+    limit = concurrency or LLM_CONCURRENCY
+    if limit <= 1 or len(calls) == 1:
+        return [fn() for fn in calls]
+    results = asyncio.run(_gather_ordered(calls, limit))
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+    return results
 
 
 # --- Category names as in prompts and DB ---
@@ -132,6 +224,78 @@ def extract_insights(transcript: str, prompt_set: str = DEFAULT_PROMPT_SET) -> l
     return parse_extract_insights_output(raw)
 
 
+def parse_extract_insights_batched_output(text: str) -> list[dict[str, Any]] | None:
+    """
+    Parse the <insights>[...]</insights> JSON from extract_insights_batched into a list of
+    {category, title, description, start_time_sec, end_time_sec, framework_markdown}.
+    Returns None if no JSON array can be parsed (caller should fall back to extract_insights).
+    """
+    m = re.search(r"<insights>([\s\S]*?)</insights>", text or "")
+    body = m.group(1) if m else (text or "")
+    body = re.sub(r"^\s*```(?:json)?|```\s*$", "", body.strip())
+    start, end = body.find("["), body.rfind("]")
+    if start < 0 or end < start:
+        return None
+    try:
+        items = json.loads(body[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+    out: list[dict[str, Any]] = []
+    for x in items:
+        if not isinstance(x, dict):
+            continue
+        title = str(x.get("title") or "").strip()
+        desc = str(x.get("description") or "").strip()
+        if not title and not desc:
+            continue
+        st = _parse_time(str(x.get("start_time") or ""))
+        et = _parse_time(str(x.get("end_time") or ""))
+        if st is None or et is None or et < st:
+            st = et = None
+        out.append({
+            "category": str(x.get("category") or "").strip().rstrip(":"),
+            "title": title,
+            "description": desc,
+            "start_time_sec": st,
+            "end_time_sec": et,
+            "framework_markdown": str(x.get("framework_markdown") or "").strip() or None,
+        })
+    return out
+
+
+def extract_insights_batched(transcript: str, prompt_set: str = DEFAULT_PROMPT_SET) -> list[dict[str, Any]] | None:
+    """
+    One call per chunk returning every insight with title, timestamps and framework (see
+    parse_extract_insights_batched_output). transcript should be timestamped (HH:MM:SS Speaker: text).
+    Returns None if the prompt is missing or the response can't be parsed.
+    """
+    tpl = _load_prompt("extract_insights_batched", prompt_set)
+    if not tpl:
+        return None
+    user = tpl.replace("{transcript}", transcript)
+    system = "You are an expert eCommerce and DTC podcast analyst. Output only the JSON array inside <insights>...</insights>."
+    raw = _anthropic_message(system, user, max_tokens=8192)
+    return parse_extract_insights_batched_output(raw)
+
+
+def extract_insights_many(
+    chunks: Sequence[str],
+    prompt_set: str = DEFAULT_PROMPT_SET,
+    *,
+    concurrency: int | None = None,
+) -> list[list[dict[str, str]]]:
+    """Run extract_insights on every chunk concurrently (see run_llm_calls). Returns one list per chunk, in order."""
+    n = len(chunks)
+
+    def call(i: int, ch: str) -> list[dict[str, str]]:
+        print(f"  [insights] chunk {i+1}/{n}", flush=True)
+        return extract_insights(ch, prompt_set=prompt_set)
+
+    return run_llm_calls([lambda i=i, ch=ch: call(i, ch) for i, ch in enumerate(chunks)], concurrency=concurrency)
+
+
 def generate_title(insight: str, prompt_set: str = DEFAULT_PROMPT_SET) -> str:
     """Generate a short title for an insight. insight can be title + description or just description."""
     tpl = _load_prompt("title_generation", prompt_set)
@@ -0,0 +1,476 @@
+"""
+Durable job queue on the pipeline_jobs table (sql/schema.sql), shared by every API process and worker node.
+enqueue() adds a job; Worker threads claim due jobs with FOR UPDATE SKIP LOCKED under a lease (renewed while
+the job runs), so several processes or machines drain the backlog without double-processing, and jobs of a
+crashed worker are picked up again once their lease expires.
+Parent jobs (sync, process-new, backfill, reextract) expand into one child job per video and are marked done,
+with {processed, failed, video_ids, failed_ids}, when the last child finishes.
+Env: JOB_WORKERS (threads per process, default PIPELINE_CONCURRENCY or 1), JOB_LEASE_SEC (default 600),
+JOB_POLL_SEC (default 5), JOB_MAX_ATTEMPTS (default 3), JOB_RETRY_BACKOFF_SEC (default 60, doubled per attempt),
+JOB_RETENTION_DAYS (default 14; finished top-level jobs older than this are deleted).
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable
+
+import db
+
+
+class JobFailed(RuntimeError):
+    """A job ran but did not succeed; it is retried until max_attempts."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _json(v: Any) -> str | None:
+    return None if v is None else json.dumps(v, default=str)
+
+
+def enqueue(
+    cur,
+    job_type: str,
+    *,
+    video_id: str | None = None,
+    podcast: str | None = None,
+    payload: dict | None = None,
+    parent_id: str | None = None,
+    max_attempts: int | None = None,
+) -> str | None:
+    """
+    Insert a queued job and return its id; None if the same (type, video_id) is already queued or running.
+    Runs in the caller's transaction (commit to publish it to workers).
+    """
+    cur.execute(
+        """
+        INSERT INTO pipeline_jobs (type, video_id, podcast, payload, parent_id, max_attempts)
+        VALUES (%s, %s, %s, %s::jsonb, %s, %s)
+        ON CONFLICT (type, video_id) WHERE status IN ('queued', 'running') AND video_id IS NOT NULL DO NOTHING
+        RETURNING id
+        """,
+        (job_type, video_id, podcast, _json(payload or {}), parent_id, max_attempts or _env_int("JOB_MAX_ATTEMPTS", 3)),
+    )
+    row = cur.fetchone()
+    return str(row[0]) if row else None
+
+
+def submit(job_type: str, **kwargs: Any) -> str | None:
+    """enqueue() in its own short transaction."""
+    with db.connection() as conn, conn.cursor() as cur:
+        job_id = enqueue(cur, job_type, **kwargs)
+        conn.commit()
+    return job_id
+
+
+def _plain(key: str, v: Any) -> Any:
+    """JSON-friendly column value: ids as str, timestamps as ISO 8601."""
+    if key in ("job_id", "parent_id"):
+        return str(v)
+    return v.isoformat() if hasattr(v, "isoformat") else v
+
+
+def get_job(job_id: str) -> dict | None:
+    """Job as {job_id, type, status, ...} (parents include child counts), or None if unknown."""
+    try:
+        uuid.UUID(str(job_id))
+    except ValueError:
+        return None
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, type, status, video_id, podcast, attempts, max_attempts, progress, result, error,
+                   created_at, updated_at, finished_at, parent_id
+            FROM pipeline_jobs WHERE id = %s
+            """,
+            (job_id,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        keys = ("job_id", "type", "status", "video_id", "podcast", "attempts", "max_attempts", "progress", "result",
+                "error", "created_at", "updated_at", "finished_at", "parent_id")
+        out = {k: v for k, v in zip(keys, row) if v is not None}
+        cur.execute("SELECT status, COUNT(*) FROM pipeline_jobs WHERE parent_id = %s GROUP BY status", (job_id,))
+        children = dict(cur.fetchall())
+    if children:
+        out["children"] = children
+    return {k: _plain(k, v) for k, v in out.items()}
+
+
+def list_jobs(*, status: str | None = None, limit: int = 50) -> list[dict]:
+    """Most recent top-level jobs (optionally one status), newest first."""
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, type, status, attempts, error, created_at, finished_at FROM pipeline_jobs
+            WHERE parent_id IS NULL AND (%s::text IS NULL OR status = %s)
+            ORDER BY created_at DESC LIMIT %s
+            """,
+            (status, status, max(1, min(limit, 500))),
+        )
+        rows = cur.fetchall()
+    keys = ("job_id", "type", "status", "attempts", "error", "created_at", "finished_at")
+    return [{k: _plain(k, v) for k, v in zip(keys, r) if v is not None} for r in rows]
+
+
+def queue_stats() -> dict[str, int]:
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT status, COUNT(*) FROM pipeline_jobs GROUP BY status")
+        return dict(cur.fetchall())
+
+
+# --- Handlers: job dict -> result dict. A "_children" key lists per-video child jobs to enqueue. ---------------
+
+def _video_children(rows: list[tuple[str, str]], child_type: str) -> list[dict]:
+    return [{"type": child_type, "video_id": vid, "podcast": pod} for vid, pod in rows]
+
+
+def _handle_sync(job: dict) -> dict:
+    from pipeline import _fetch_new, _get_unprocessed
+
+    if not os.environ.get("YOUTUBE_API_KEY"):
+        raise JobFailed("YOUTUBE_API_KEY not set")
+    with db.connection() as conn, conn.cursor() as cur:
+        counts = _fetch_new(cur)
+        conn.commit()
+        rows = _get_unprocessed(cur)
+    return {**counts, "_children": _video_children(rows, "process")}
+
+
+def _handle_process_new(job: dict) -> dict:
+    from pipeline import _get_unprocessed
+
+    with db.connection() as conn, conn.cursor() as cur:
+        rows = _get_unprocessed(cur)
+    return {"_children": _video_children(rows, "process")}
+
+
+def _handle_backfill(job: dict) -> dict:
+    from pipeline import _get_unprocessed, _seed_from_db
+
+    with db.connection() as conn, conn.cursor() as cur:
+        counts = _seed_from_db(cur)
+        conn.commit()
+        rows = _get_unprocessed(cur)
+    seed_counts = {k: counts[k] for k in ("inserted", "updated", "unchanged")}
+    return {"seeded": counts["upserted"], "seed_counts": seed_counts, "_children": _video_children(rows, "process")}
+
+
+def _handle_reextract(job: dict) -> dict:
+    from pipeline import _get_transcribed
+
+    wanted = job["payload"].get("video_ids")
+    if wanted is not None:
+        # One child per requested video; one without a stored transcript fails instead of being dropped.
+        rows = [(vid, None) for vid in dict.fromkeys(wanted)]
+    else:
+        with db.connection() as conn, conn.cursor() as cur:
+            rows = _get_transcribed(cur)
+    return {"_children": _video_children(rows, "reextract-video")}
+
+
+def _handle_process(job: dict) -> dict:
+    from pipeline import _process_one
+
+    if not _process_one(job["video_id"], job["podcast"] or "9operators", prompt_set=job["payload"].get("prompt_set", "operators")):
+        raise JobFailed("processing failed")
+    return {"video_id": job["video_id"]}
+
+
+def _handle_reextract_video(job: dict) -> dict:
+    from pipeline import _reextract_one
+
+    if not _reextract_one(job["video_id"], prompt_set=job["payload"].get("prompt_set", "operators")):
+        raise JobFailed("reextract failed")
+    return {"video_id": job["video_id"]}
+
+
+def _handle_reindex(job: dict) -> dict:
+    from search_index import reindex_all
+
+    last = [0.0]
+
+    def progress(p: dict) -> None:
+        if p["phase"] != "indexing" or time.monotonic() - last[0] >= 2:
+            last[0] = time.monotonic()
+            set_progress(job["id"], p)
+
+    return reindex_all(batch_size=job["payload"].get("batch_size"), progress=progress)
+
+
+HANDLERS: dict[str, Callable[[dict], dict]] = {
+    "sync": _handle_sync,
+    "process-new": _handle_process_new,
+    "backfill": _handle_backfill,
+    "reextract": _handle_reextract,
+    "process": _handle_process,
+    "reextract-video": _handle_reextract_video,
+    "reindex": _handle_reindex,
+}
+
+
+def set_progress(job_id: str, progress: dict) -> None:
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE pipeline_jobs SET progress = %s::jsonb, updated_at = now() WHERE id = %s", (_json(progress), job_id)
+        )
+        conn.commit()
+
+
+# --- Worker ---------------------------------------------------------------------------------------------------
+
+def _finish_parent_if_done(cur, parent_id: str) -> None:
+    """Mark a waiting parent done once no child is queued or running. Call inside a transaction."""
+    # Lock the parent so concurrent child completions check the children one after another.
+    cur.execute("SELECT status FROM pipeline_jobs WHERE id = %s FOR UPDATE", (parent_id,))
+    row = cur.fetchone()
+    if not row or row[0] != "waiting":
+        return
+    cur.execute(
+        """
+        SELECT COUNT(*) FILTER (WHERE status IN ('queued', 'running')),
+               COALESCE(array_agg(video_id ORDER BY video_id) FILTER (WHERE status = 'done'), '{}'),
+               COALESCE(array_agg(video_id ORDER BY video_id) FILTER (WHERE status = 'error'), '{}')
+        FROM pipeline_jobs WHERE parent_id = %s
+        """,
+        (parent_id,),
+    )
+    active, done_ids, failed_ids = cur.fetchone()
+    if active:
+        return
+    summary = {"processed": len(done_ids), "failed": len(failed_ids), "video_ids": done_ids, "failed_ids": failed_ids}
+    cur.execute(
+        """
+        UPDATE pipeline_jobs SET status = 'done', result = COALESCE(result, '{}'::jsonb) || %s::jsonb,
+               finished_at = now(), updated_at = now()
+        WHERE id = %s
+        """,
+        (_json(summary), parent_id),
+    )
+
+
+class Worker:
+    """
+    `concurrency` threads that each claim one job at a time (FOR UPDATE SKIP LOCKED), run its handler and
+    record the outcome, plus a heartbeat thread renewing the leases of running jobs. start() / stop().
+    """
+
+    def __init__(self, *, concurrency: int | None = None, worker_id: str | None = None):
+        from pipeline import _default_workers
+
+        self.concurrency = max(1, concurrency or _env_int("JOB_WORKERS", _default_workers()))
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_sec = max(30, _env_int("JOB_LEASE_SEC", 600))
+        self.poll_sec = max(1, _env_int("JOB_POLL_SEC", 5))
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._running: set[str] = set()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def run_forever(self) -> None:
+        """Start and block until interrupted (CLI worker nodes)."""
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            print("Stopping worker...", flush=True)
+        self.stop()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            running = len(self._running)
+        return {"worker_id": self.worker_id, "threads": self.concurrency, "running": running,
+                "completed": self.completed, "failed": self.failed}
+
+    def claim(self) -> dict | None:
+        """Claim the oldest due job (queued, or running with an expired lease), or None."""
+        with db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = 'running', attempts = attempts + 1, locked_by = %s,
+                       lease_expires_at = now() + make_interval(secs => %s), updated_at = now()
+                WHERE id = (
+                  SELECT id FROM pipeline_jobs
+                  WHERE ((status = 'queued' AND run_after <= now()) OR (status = 'running' AND lease_expires_at < now()))
+                    AND attempts < max_attempts
+                  ORDER BY created_at
+                  LIMIT 1
+                  FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, type, video_id, podcast, payload, attempts, max_attempts, parent_id
+                """,
+                (self.worker_id, self.lease_sec),
+            )
+            row = cur.fetchone()
+            conn.commit()
+        if not row:
+            return None
+        keys = ("id", "type", "video_id", "podcast", "payload", "attempts", "max_attempts", "parent_id")
+        job = dict(zip(keys, row))
+        job["id"] = str(job["id"])
+        job["parent_id"] = str(job["parent_id"]) if job["parent_id"] else None
+        job["payload"] = job["payload"] or {}
+        return job
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.claim()
+            except Exception as e:
+                print(f"  [jobs] claim failed: {e!s}", flush=True)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_sec)
+                continue
+            with self._lock:
+                self._running.add(job["id"])
+            try:
+                self.execute(job)
+            finally:
+                with self._lock:
+                    self._running.discard(job["id"])
+
+    def execute(self, job: dict) -> None:
+        handler = HANDLERS.get(job["type"])
+        print(f"  [jobs] {job['type']} {job.get('video_id') or job['id']} (attempt {job['attempts']})", flush=True)
+        try:
+            if handler is None:
+                raise JobFailed(f"unknown job type: {job['type']}")
+            result = handler(job)
+        except Exception as e:
+            self._fail(job, str(e) or type(e).__name__)
+            return
+        self._complete(job, result or {})
+
+    def _complete(self, job: dict, result: dict) -> None:
+        children = result.pop("_children", None)
+        with db.connection() as conn, conn.cursor() as cur:
+            status = "done"
+            if children is not None:
+                n = 0
+                for c in children:
+                    c_payload = {k: v for k, v in job["payload"].items() if k in ("prompt_set",)}
+                    if enqueue(cur, c["type"], video_id=c["video_id"], podcast=c["podcast"], payload=c_payload, parent_id=job["id"]):
+                        n += 1
+                result["queued"] = n
+                status = "waiting" if n else "done"
+                if not n:
+                    result.update(processed=0, failed=0, video_ids=[], failed_ids=[])
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = %s, result = %s::jsonb, error = NULL, locked_by = NULL,
+                       lease_expires_at = NULL, updated_at = now(), finished_at = CASE WHEN %s = 'done' THEN now() END
+                WHERE id = %s AND locked_by = %s
+                """,
+                (status, _json(result), status, job["id"], self.worker_id),
+            )
+            if cur.rowcount == 0:
+                # Lease lost (another worker reclaimed the job): drop our outcome, including queued children.
+                conn.rollback()
+                print(f"  [jobs] {job['id']}: lease lost, result discarded", flush=True)
+                return
+            if job["parent_id"]:
+                _finish_parent_if_done(cur, job["parent_id"])
+            conn.commit()
+        with self._lock:
+            self.completed += 1
+
+    def _fail(self, job: dict, error: str) -> None:
+        retry = job["attempts"] < job["max_attempts"]
+        backoff = _env_int("JOB_RETRY_BACKOFF_SEC", 60) * (2 ** (job["attempts"] - 1))
+        with db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = %s, error = %s, locked_by = NULL, lease_expires_at = NULL,
+                       run_after = now() + make_interval(secs => %s), updated_at = now(),
+                       finished_at = CASE WHEN %s = 'error' THEN now() END
+                WHERE id = %s AND locked_by = %s
+                """,
+                ("queued" if retry else "error", error[:2000], backoff, "queued" if retry else "error", job["id"], self.worker_id),
+            )
+            if cur.rowcount and not retry and job["parent_id"]:
+                _finish_parent_if_done(cur, job["parent_id"])
+            conn.commit()
+        with self._lock:
+            self.failed += 1
+        print(f"  [jobs] {job['type']} {job.get('video_id') or job['id']} failed{' (will retry)' if retry else ''}: {error}", flush=True)
+
+    def _heartbeat(self) -> None:
+        """Renew the leases of running jobs; also the one thread per worker that runs sweep (about once a minute)."""
+        last_sweep = 0.0
+        while not self._stop.wait(min(self.lease_sec / 3, 60)):
+            with self._lock:
+                ids = list(self._running)
+            if ids:
+                try:
+                    with db.connection() as conn, conn.cursor() as cur:
+                        cur.execute(
+                            """
+                            UPDATE pipeline_jobs SET lease_expires_at = now() + make_interval(secs => %s)
+                            WHERE id = ANY(%s::uuid[]) AND locked_by = %s
+                            """,
+                            (self.lease_sec, ids, self.worker_id),
+                        )
+                        conn.commit()
+                except Exception as e:
+                    print(f"  [jobs] lease renewal failed: {e!s}", flush=True)
+            if time.monotonic() - last_sweep >= 60:
+                last_sweep = time.monotonic()
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"  [jobs] sweep failed: {e!s}", flush=True)
+
+    def sweep(self) -> None:
+        """Fail jobs whose lease expired on their last attempt, and delete old finished top-level jobs."""
+        with db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE pipeline_jobs SET status = 'error', error = COALESCE(error, 'lease expired'), locked_by = NULL,
+                       lease_expires_at = NULL, finished_at = now(), updated_at = now()
+                WHERE status = 'running' AND lease_expires_at < now() AND attempts >= max_attempts
+                RETURNING parent_id
+                """
+            )
+            for (parent_id,) in cur.fetchall():
+                if parent_id:
+                    _finish_parent_if_done(cur, str(parent_id))
+            cur.execute(
+                """
+                DELETE FROM pipeline_jobs
+                WHERE parent_id IS NULL AND status IN ('done', 'error')
+                  AND finished_at < now() - make_interval(days => %s)
+                """,
+                (_env_int("JOB_RETENTION_DAYS", 14),),
+            )
+            conn.commit()
@@ -0,0 +1,157 @@
+"""
+Persistent, content-addressed cache for LLM responses (SQLite file, safe across threads and processes).
+Key = sha256 of (model, max_tokens, system, user), so reprocessing with unchanged prompts costs nothing.
+Eviction: entries older than LLM_CACHE_MAX_AGE_DAYS, then least-recently-used entries beyond LLM_CACHE_MAX_MB.
+LLM_CACHE=0 (or --no-llm-cache on the CLI) bypasses the cache; LLM_CACHE_PATH overrides the file location.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_PATH = ROOT / ".cache" / "llm_cache.sqlite3"
+
+# Run eviction every N writes rather than on every put.
+_EVICT_EVERY = 100
+
+
+def cache_key(model: str, system: str, user: str, max_tokens: int) -> str:
+    h = hashlib.sha256()
+    for part in (model, str(max_tokens), system, user):
+        data = (part or "").encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response store with LRU + age eviction and hit/miss counters."""
+
+    def __init__(self, path: str | Path, *, max_bytes: int, max_age_sec: float):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+              key TEXT PRIMARY KEY,
+              response TEXT NOT NULL,
+              size INTEGER NOT NULL,
+              created_at REAL NOT NULL,
+              last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age_sec > 0 and now - row[1] > self.max_age_sec):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict_locked()
+
+    def evict(self) -> int:
+        """Drop expired entries, then LRU entries until under max_bytes. Returns rows deleted."""
+        with self._lock:
+            return self._evict_locked()
+
+    def _evict_locked(self) -> int:
+        deleted = 0
+        if self.max_age_sec > 0:
+            deleted += self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age_sec,)
+            ).rowcount
+        if self.max_bytes > 0:
+            deleted += self._conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                  SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM llm_cache
+                  ) WHERE running > ?
+                )
+                """,
+                (self.max_bytes,),
+            ).rowcount
+        return deleted
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size, "path": str(self.path)}
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+_bypass = False
+
+
+def set_bypass(bypass: bool = True) -> None:
+    """Turn the cache off (or back on) for this process, e.g. from --no-llm-cache."""
+    global _bypass
+    _bypass = bypass
+
+
+def get_cache() -> LLMCache | None:
+    """Process-wide cache, or None when bypassed (LLM_CACHE=0 / set_bypass) or the file can't be opened."""
+    global _cache
+    if _bypass or os.environ.get("LLM_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                max_mb = float(os.environ.get("LLM_CACHE_MAX_MB", "512"))
+                max_days = float(os.environ.get("LLM_CACHE_MAX_AGE_DAYS", "90"))
+            except ValueError:
+                max_mb, max_days = 512.0, 90.0
+            try:
+                _cache = LLMCache(
+                    os.environ.get("LLM_CACHE_PATH") or DEFAULT_PATH,
+                    max_bytes=int(max_mb * 1024 * 1024),
+                    max_age_sec=max_days * 86400,
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"  [llm-cache] disabled: {e!s}", flush=True)
+                set_bypass(True)
+                return None
+        return _cache
+
+
+def cache_stats() -> dict[str, Any] | None:
+    """Stats of the process-wide cache, or None if it is off or not opened yet."""
+    c = _cache
+    if c is None or _bypass:
+        return None
+    return c.stats()
@@ -5,18 +5,28 @@ Usage:
   python pipeline.py --seed-csvs --process-all
   python pipeline.py --seed-csvs-to-db        # CSVs -> seed_links (Supabase)
   python pipeline.py --seed-from-db [--process-all]   # seed_links -> videos; with --process-all then process unprocessed
-  python pipeline.py --process VIDEO_ID [--podcast 9operators|marketing_operator|finance_operators]
+  python pipeline.py --process VIDEO_ID [--podcast 9operators|marketing_operator|finance_operators] [--restart]
   python pipeline.py --fetch-new              # fetch new videos from YouTube channels, upsert to videos
-  python pipeline.py --process-new            # process videos that have no transcription yet
+  python pipeline.py --fetch-new --full-history   # backfill every upload of each channel (uploads playlist, all pages)
+  python pipeline.py --process-new            # process videos not yet indexed (resumes after each one's last checkpoint)
   python pipeline.py --fetch-new --process-new
+  python pipeline.py --process-new --workers 4   # process 4 videos concurrently (or PIPELINE_CONCURRENCY=4)
+  python pipeline.py --process-new --staged --stage-workers download=2,transcribe=2,extract=3,enrich=3,store=1
+  python pipeline.py --reextract VIDEO_ID|all   # rerun insight extraction from stored transcripts (no download/transcribe)
+  python pipeline.py --sync-outbox           # push queued insights to Meilisearch (search_outbox)
+  python pipeline.py --worker [--workers 4]   # run a job-queue worker node (pipeline_jobs), until Ctrl+C
+  python pipeline.py --reindex [--reindex-batch-size 1000]   # rebuild the Meilisearch index from Postgres, swap atomically
 """
 from __future__ import annotations
 
 import argparse
 import os
 import sys
+import time
 from pathlib import Path
 
+import db
+
 ROOT = Path(__file__).resolve().parent
 _env = ROOT / ".env"
 try:
@@ -32,18 +42,74 @@ except ImportError:
                     os.environ.setdefault(k.strip(), v.strip())
 
 
-def _chunk_text(text: str, size: int = 6000, overlap: int = 500) -> list[str]:
-    out: list[str] = []
+def _chunk_spans(text: str, size: int = 6000, overlap: int = 500) -> list[tuple[int, int]]:
+    """(start_char, end_char) of each chunk of text; consecutive chunks share `overlap` chars."""
+    out: list[tuple[int, int]] = []
     start = 0
     while start < len(text):
         end = start + size
-        out.append(text[start:end])
+        out.append((start, min(end, len(text))))
         if end >= len(text):
             break
         start = end - overlap
     return out
 
 
+def _chunk_text(text: str, size: int = 6000, overlap: int = 500) -> list[str]:
+    return [text[a:b] for a, b in _chunk_spans(text, size, overlap)]
+
+
+def _chunk_utterances(utterances: list[dict], size: int = 6000, overlap: int = 500) -> list[dict]:
+    """
+    Chunk the utterance text (joined with spaces) like _chunk_text, keeping where each chunk sits:
+    {text, start_char, end_char, start_sec, end_sec}. Times are the start of the first and the end of the
+    last utterance overlapping the chunk (None if those utterances have no times).
+    """
+    import bisect
+
+    parts: list[str] = []
+    offsets: list[int] = []
+    pos = 0
+    for u in utterances:
+        t = (u.get("transcript") or "").strip()
+        offsets.append(pos)
+        parts.append(t)
+        pos += len(t) + 1
+    text = " ".join(parts)
+    out: list[dict] = []
+    for a, b in _chunk_spans(text, size, overlap):
+        first = max(0, bisect.bisect_right(offsets, a) - 1)
+        last = max(first, bisect.bisect_left(offsets, b) - 1)
+        out.append({
+            "text": text[a:b],
+            "start_char": a,
+            "end_char": b,
+            "start_sec": utterances[first].get("start"),
+            "end_sec": utterances[last].get("end"),
+        })
+    return out
+
+
+# Context kept around a chunk's time range when sending a timestamped window to the LLM.
+TIMESTAMP_WINDOW_MARGIN_SEC = 30.0
+
+
+def _timestamped_window(
+    utterances: list[dict],
+    start_sec: float | None,
+    end_sec: float | None,
+    margin_sec: float = TIMESTAMP_WINDOW_MARGIN_SEC,
+) -> str:
+    """_format_timestamped for utterances within [start_sec - margin, end_sec + margin]; all of them if no range."""
+    if start_sec is None or end_sec is None:
+        return _format_timestamped(utterances)
+    lo, hi = float(start_sec) - margin_sec, float(end_sec) + margin_sec
+    return _format_timestamped([
+        u for u in utterances
+        if u.get("start") is not None and float(u["start"]) <= hi and float(u.get("end") or u["start"]) >= lo
+    ])
+
+
 def _format_timestamped(utterances: list[dict]) -> str:
     lines: list[str] = []
     for u in utterances:
@@ -61,6 +127,69 @@ def _format_timestamped(utterances: list[dict]) -> str:
     return "\n".join(lines)
 
 
+VIDEO_COLUMNS = ("video_id", "podcast", "title", "duration_seconds", "channel_id", "published_at")
+SEED_LINK_COLUMNS = ("video_id", "podcast", "title", "duration_seconds", "url")
+
+
+def _merge_rows(rows, key, columns: tuple[str, ...]) -> list[tuple]:
+    """
+    Collapse rows (dicts) sharing key(row) into one tuple in `columns` order; later non-empty values win, as
+    they would with one upsert per row. One multi-row upsert can't touch the same row twice.
+    """
+    merged: dict[tuple | str, dict] = {}
+    for r in rows:
+        k = key(r)
+        if k is None:
+            continue
+        cur = merged.setdefault(k, {})
+        for c in columns:
+            v = r.get(c)
+            if v is not None and v != "":
+                cur[c] = v
+    return [tuple(m.get(c) for c in columns) for m in merged.values()]
+
+
+def upsert_videos(cursor, rows) -> dict[str, int]:
+    """
+    Upsert videos (dicts with VIDEO_COLUMNS keys; video_id and podcast required) in multi-row statements.
+    Empty incoming values keep the stored ones; rows that would not change are not rewritten.
+    Returns {upserted, inserted, updated, unchanged} over distinct videos (db.upsert_rows).
+    """
+    def key(r):
+        vid, pod = (r.get("video_id") or "").strip(), (r.get("podcast") or "").strip()
+        return vid if vid and pod else None
+
+    def norm(r):
+        return {**r, "video_id": (r.get("video_id") or "").strip(), "podcast": (r.get("podcast") or "").strip()}
+
+    return db.upsert_rows(
+        cursor,
+        "videos",
+        VIDEO_COLUMNS,
+        [(vid, pod, title or "", *rest) for vid, pod, title, *rest in _merge_rows((norm(r) for r in rows), key, VIDEO_COLUMNS)],
+        conflict="video_id",
+        update="""
+          podcast = EXCLUDED.podcast,
+          title = COALESCE(NULLIF(EXCLUDED.title,''), videos.title),
+          duration_seconds = COALESCE(EXCLUDED.duration_seconds, videos.duration_seconds),
+          channel_id = COALESCE(EXCLUDED.channel_id, videos.channel_id),
+          published_at = COALESCE(EXCLUDED.published_at, videos.published_at),
+          updated_at = now()
+        """,
+        where="""
+          (videos.podcast, videos.title, videos.duration_seconds, videos.channel_id, videos.published_at)
+          IS DISTINCT FROM (
+            EXCLUDED.podcast,
+            COALESCE(NULLIF(EXCLUDED.title,''), videos.title),
+            COALESCE(EXCLUDED.duration_seconds, videos.duration_seconds),
+            COALESCE(EXCLUDED.channel_id, videos.channel_id),
+            COALESCE(EXCLUDED.published_at, videos.published_at)
+          )
+        """,
+        template="(%s, %s, %s, %s, %s, %s::timestamptz)",
+    )
+
+
 def _ensure_video(
     cursor,
     video_id: str,
@@ -70,293 +199,995 @@ def _ensure_video(
     channel_id: str | None = None,
     published_at: str | None = None,
 ) -> None:
-    cursor.execute(
-        """
-        INSERT INTO videos (video_id, podcast, title, duration_seconds, channel_id, published_at)
-        VALUES (%s, %s, %s, %s, %s, %s::timestamptz)
-        ON CONFLICT (video_id) DO UPDATE SET
-          podcast = EXCLUDED.podcast,
-          title = COALESCE(NULLIF(EXCLUDED.title,''), videos.title),
-          duration_seconds = COALESCE(EXCLUDED.duration_seconds, videos.duration_seconds),
-          channel_id = COALESCE(EXCLUDED.channel_id, videos.channel_id),
-          published_at = COALESCE(EXCLUDED.published_at, videos.published_at),
-          updated_at = now()
-        """,
-        (video_id, podcast, title or "", duration_seconds, channel_id, published_at),
+    upsert_videos(
+        cursor,
+        [{
+            "video_id": video_id,
+            "podcast": podcast,
+            "title": title or "",
+            "duration_seconds": duration_seconds,
+            "channel_id": channel_id,
+            "published_at": published_at,
+        }],
     )
 
 
-def _seed_csvs(cursor, paths_override: dict[str, str] | None = None) -> int:
+def _seed_csvs(cursor, paths_override: dict[str, str] | None = None) -> dict[str, int]:
     from youtube_client import load_all_seed_csvs
 
-    rows = load_all_seed_csvs(paths=paths_override)
-    for r in rows:
-        _ensure_video(
-            cursor,
-            r["video_id"],
-            r["podcast"],
-            r.get("title") or "",
-            r.get("duration_seconds"),
-        )
-    return len(rows)
+    return upsert_videos(cursor, load_all_seed_csvs(paths=paths_override))
 
 
-def upsert_seed_links(cursor, rows: list[dict]) -> int:
+def upsert_seed_links(cursor, rows) -> dict[str, int]:
     """
     Upsert into seed_links. Each row: video_id, podcast, title?, duration_seconds?, url?.
-    Returns number of rows upserted. ON CONFLICT (video_id, podcast) DO UPDATE.
+    rows may be any iterable (e.g. a CSV stream): it is consumed db.BULK_PAGE_SIZE rows at a time, each batch
+    deduped on (video_id, podcast) and sent as one multi-row statement.
+    ON CONFLICT (video_id, podcast) DO UPDATE, only where a value differs.
+    Returns {upserted, inserted, updated, unchanged}.
     """
-    n = 0
-    for r in rows:
-        vid = (r.get("video_id") or "").strip()
-        pod = (r.get("podcast") or "").strip()
-        if not vid or not pod:
-            continue
-        cursor.execute(
-            """
-            INSERT INTO seed_links (video_id, podcast, title, duration_seconds, url)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (video_id, podcast) DO UPDATE SET
-              title = COALESCE(NULLIF(EXCLUDED.title,''), seed_links.title),
-              duration_seconds = COALESCE(EXCLUDED.duration_seconds, seed_links.duration_seconds),
-              url = COALESCE(NULLIF(EXCLUDED.url,''), seed_links.url),
-              updated_at = now()
-            """,
-            (
-                vid,
-                pod,
-                (r.get("title") or "")[:2048] if r.get("title") else "",
-                r.get("duration_seconds"),
-                (r.get("url") or "")[:2048] if r.get("url") else "",
-            ),
-        )
-        n += 1
-    return n
+    from youtube_client import batched
 
+    totals = {"upserted": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    for batch in batched(rows, db.BULK_PAGE_SIZE):
+        counts = _upsert_seed_link_batch(cursor, batch)
+        for k in totals:
+            totals[k] += counts[k]
+    return totals
 
-def _seed_from_db(cursor) -> int:
-    """Upsert from seed_links into videos. Returns number of rows upserted."""
-    cursor.execute("SELECT video_id, podcast, title, duration_seconds FROM seed_links")
-    rows = cursor.fetchall()
-    for r in rows:
-        _ensure_video(cursor, r[0], r[1], r[2] or "", r[3])
-    return len(rows)
+
+def _upsert_seed_link_batch(cursor, rows: list[dict]) -> dict[str, int]:
+    def key(r):
+        return (r["video_id"], r["podcast"]) if r["video_id"] and r["podcast"] else None
+
+    def norm(r):
+        return {
+            "video_id": (r.get("video_id") or "").strip(),
+            "podcast": (r.get("podcast") or "").strip(),
+            "title": (r.get("title") or "")[:2048],
+            "duration_seconds": r.get("duration_seconds"),
+            "url": (r.get("url") or "")[:2048],
+        }
+
+    merged = _merge_rows((norm(r) for r in rows), key, SEED_LINK_COLUMNS)
+    return db.upsert_rows(
+        cursor,
+        "seed_links",
+        SEED_LINK_COLUMNS,
+        [(vid, pod, title or "", dur, url or "") for vid, pod, title, dur, url in merged],
+        conflict="video_id, podcast",
+        update="""
+          title = COALESCE(NULLIF(EXCLUDED.title,''), seed_links.title),
+          duration_seconds = COALESCE(EXCLUDED.duration_seconds, seed_links.duration_seconds),
+          url = COALESCE(NULLIF(EXCLUDED.url,''), seed_links.url),
+          updated_at = now()
+        """,
+        where="""
+          (seed_links.title, seed_links.duration_seconds, seed_links.url)
+          IS DISTINCT FROM (
+            COALESCE(NULLIF(EXCLUDED.title,''), seed_links.title),
+            COALESCE(EXCLUDED.duration_seconds, seed_links.duration_seconds),
+            COALESCE(NULLIF(EXCLUDED.url,''), seed_links.url)
+          )
+        """,
+    )
+
+
+def _seed_from_db(cursor) -> dict[str, int]:
+    """
+    Upsert from seed_links into videos in one INSERT ... SELECT (nothing round-trips through Python), touching
+    only videos whose values differ. A video listed under several podcasts takes its most recently updated seed
+    link. Returns {upserted, inserted, updated, unchanged}.
+    """
+    cursor.execute(
+        """
+        WITH written AS (
+          INSERT INTO videos (video_id, podcast, title, duration_seconds)
+          SELECT DISTINCT ON (video_id) video_id, podcast, COALESCE(title, ''), duration_seconds
+          FROM seed_links
+          ORDER BY video_id, updated_at DESC NULLS LAST
+          ON CONFLICT (video_id) DO UPDATE SET
+            podcast = EXCLUDED.podcast,
+            title = COALESCE(NULLIF(EXCLUDED.title,''), videos.title),
+            duration_seconds = COALESCE(EXCLUDED.duration_seconds, videos.duration_seconds),
+            updated_at = now()
+          WHERE (videos.podcast, videos.title, videos.duration_seconds)
+            IS DISTINCT FROM (
+              EXCLUDED.podcast,
+              COALESCE(NULLIF(EXCLUDED.title,''), videos.title),
+              COALESCE(EXCLUDED.duration_seconds, videos.duration_seconds)
+            )
+          RETURNING (xmax = 0) AS inserted
+        )
+        SELECT (SELECT COUNT(DISTINCT video_id) FROM seed_links),
+               COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+        FROM written
+        """
+    )
+    total, inserted, updated = cursor.fetchone()
+    return {"upserted": total, "inserted": inserted, "updated": updated, "unchanged": total - inserted - updated}
 
 
-def _seed_csvs_to_db(cursor, paths_override: dict[str, str] | None = None) -> int:
-    """Load CSVs and upsert into seed_links. Returns number upserted."""
+def _seed_csvs_to_db(cursor, paths_override: dict[str, str] | None = None) -> dict[str, int]:
+    """Load CSVs and upsert into seed_links. Returns {upserted, inserted, updated, unchanged}."""
     from youtube_client import load_all_seed_csvs
 
     rows = load_all_seed_csvs(paths=paths_override)
     return upsert_seed_links(cursor, rows)
 
 
-def _fetch_new(cursor, *, max_per_channel: int = 50, min_duration_sec: int = 300) -> int:
-    """Fetch recent videos from YouTube channels (Operators9, MarketingOperators, FinanceOperators) and upsert into videos. Requires YOUTUBE_API_KEY."""
-    from youtube_client import fetch_channel_videos, get_channel_handle, resolve_channel_id
+def _fetch_channel(handle: str, podcast: str, state: tuple | None, *, max_per_channel: int, full_history: bool) -> dict:
+    """One channel's fetch for _fetch_new (no DB access, runs on a worker thread)."""
+    from youtube_client import fetch_channel_update, resolve_channel_id
 
-    total = 0
-    for podcast in ("9operators", "marketing_operator", "finance_operators"):
-        handle = get_channel_handle(podcast)
-        if not handle:
-            continue
-        cid = resolve_channel_id(handle)
-        if not cid:
+    cid, watermark, etag = state or (None, None, None)
+    cid = cid or resolve_channel_id(handle)
+    if not cid:
+        return {"channel_id": None, "watermark": watermark}
+    if full_history:
+        out = fetch_channel_update(cid, podcast=podcast, max_results=None)
+    elif watermark is not None:
+        out = fetch_channel_update(cid, podcast=podcast, max_results=None, since=watermark, etag=etag)
+    else:
+        out = fetch_channel_update(cid, podcast=podcast, max_results=max_per_channel)
+    return {"channel_id": cid, "watermark": watermark, **out}
+
+
+def _fetch_new(cursor, *, max_per_channel: int = 50, min_duration_sec: int = 300, full_history: bool = False) -> dict[str, int]:
+    """
+    Fetch new videos from YouTube channels (Operators9, MarketingOperators, FinanceOperators) and upsert into videos.
+    Channels are fetched in parallel with no connection held, then written in the caller's transaction (the
+    caller commits).
+    Incremental: each channel's uploads playlist is paged back to its watermark in youtube_channels (newest
+    published_at seen), with If-None-Match on the stored ETag so an unchanged channel is one 304; a channel with no
+    watermark yet gets its latest max_per_channel uploads, full_history=True its whole upload history. Channel IDs
+    are cached in youtube_channels. Requires YOUTUBE_API_KEY.
+    Returns {upserted, inserted, updated, unchanged} summed over channels (unchanged videos are not rewritten).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from youtube_client import get_channel_handle, newest_published_at
+
+    channels = [(pod, h) for pod in ("9operators", "marketing_operator", "finance_operators") if (h := get_channel_handle(pod))]
+    totals = {"upserted": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    if not channels:
+        return totals
+    # Channel state from a short-lived connection of its own: no connection is held (and the caller's transaction
+    # is not touched) during the API round trips.
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT handle, channel_id, published_watermark, uploads_etag FROM youtube_channels WHERE handle = ANY(%s)",
+            ([h for _, h in channels],),
+        )
+        states = {r[0]: r[1:] for r in cur.fetchall()}
+    with ThreadPoolExecutor(max_workers=len(channels), thread_name_prefix="fetch-new") as ex:
+        futures = [
+            (pod, h, ex.submit(_fetch_channel, h, pod, states.get(h), max_per_channel=max_per_channel, full_history=full_history))
+            for pod, h in channels
+        ]
+        results = []
+        for pod, h, fut in futures:
+            try:
+                results.append((pod, h, fut.result()))
+            except Exception as e:
+                print(f"  [fetch-new] {pod}: {e!s}", flush=True)
+
+    for podcast, handle, res in results:
+        if not res["channel_id"]:
             print(f"  [fetch-new] {podcast}: could not resolve @{handle}", flush=True)
             continue
-        videos = fetch_channel_videos(cid, podcast=podcast, max_results=max_per_channel)
-        n = 0
-        for v in videos:
-            dur = v.get("duration_seconds")
-            if dur is not None and dur < min_duration_sec:
-                continue
-            _ensure_video(
-                cursor,
-                v["video_id"],
-                v["podcast"],
-                v.get("title") or "",
-                dur,
-                channel_id=v.get("channel_id"),
-                published_at=v.get("published_at"),
-            )
-            n += 1
-            total += 1
-        print(f"  [fetch-new] {podcast}: {n} upserted (from {len(videos)} fetched)", flush=True)
-    return total
+        videos = res["videos"]
+        counts = upsert_videos(
+            cursor,
+            [v for v in videos if v.get("duration_seconds") is None or v["duration_seconds"] >= min_duration_sec],
+        )
+        for k in totals:
+            totals[k] += counts[k]
+        # Watermark only moves forward (a full-history run may return nothing newer).
+        cursor.execute(
+            """
+            INSERT INTO youtube_channels (handle, podcast, channel_id, published_watermark, uploads_etag, last_fetched_at)
+            VALUES (%s, %s, %s, %s, %s, now())
+            ON CONFLICT (handle) DO UPDATE SET
+              podcast = EXCLUDED.podcast,
+              channel_id = EXCLUDED.channel_id,
+              published_watermark = GREATEST(youtube_channels.published_watermark, EXCLUDED.published_watermark),
+              uploads_etag = EXCLUDED.uploads_etag,
+              last_fetched_at = now(),
+              updated_at = now()
+            """,
+            (handle, podcast, res["channel_id"], newest_published_at(videos), res["etag"]),
+        )
+        if res["not_modified"]:
+            print(f"  [fetch-new] {podcast}: unchanged (304)", flush=True)
+            continue
+        watermark = res["watermark"]
+        since = f", since {watermark:%Y-%m-%d}" if watermark is not None and not full_history else ""
+        print(f"  [fetch-new] {podcast}: {db.count_summary(counts)} (from {len(videos)} fetched{since})", flush=True)
+    return totals
 
 
 def _get_unprocessed(cursor) -> list[tuple[str, str]]:
-    """Return (video_id, podcast) for videos that have no transcription yet."""
+    """
+    Return (video_id, podcast) for videos whose pipeline has not reached "indexed" (video_pipeline_state), including
+    partially processed ones, which resume after their last checkpoint. Videos whose last run failed come last.
+    """
     cursor.execute(
         """
         SELECT v.video_id, v.podcast FROM videos v
-        LEFT JOIN transcriptions t ON t.video_id = v.video_id
-        WHERE t.id IS NULL
-        ORDER BY v.published_at DESC NULLS LAST, v.created_at DESC
+        LEFT JOIN video_pipeline_state s ON s.video_id = v.video_id
+        WHERE s.stage IS DISTINCT FROM 'indexed'
+        ORDER BY (s.error IS NOT NULL), v.published_at DESC NULLS LAST, v.created_at DESC
         """
     )
     return [(r[0], r[1]) for r in cursor.fetchall()]
 
 
-def _process_one(
-    video_id: str,
-    podcast: str,
-    *,
-    work_dir: Path | None = None,
-    prompt_set: str = "operators",
-) -> bool:
-    import uuid
+def _default_workers() -> int:
+    """Batch worker count from PIPELINE_CONCURRENCY (default 1 = one video at a time)."""
+    try:
+        return max(1, int(os.environ.get("PIPELINE_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    v = os.environ.get(name, "").strip().lower()
+    if not v:
+        return default
+    return v in ("1", "true", "yes", "on")
+
+
+def _video_work_dir(work_dir: Path | None, video_id: str) -> Path:
+    """Per-video subdir of work_dir (default: TEMP) so concurrent workers never share files."""
+    base = Path(work_dir) if work_dir else Path(os.environ.get("TEMP", "/tmp"))
+    return base / video_id
+
+
+# Per-video checkpoints (video_pipeline_state.stage), in order. A rerun resumes after the last one reached.
+CHECKPOINTS = ("new", "downloaded", "transcribed", "chunked", "extracted", "enriched", "indexed")
+# A stage is skipped once the job has reached this checkpoint. Download waits for "transcribed": its artifact
+# is a local file that may be gone after a restart (find_cached_audio reuses it when it is not).
+_SKIP_AT = {"download": "transcribed", "transcribe": "transcribed", "extract": "extracted", "enrich": "enriched", "store": "indexed"}
+
+
+def _reached(job: dict, checkpoint: str) -> bool:
+    return CHECKPOINTS.index(job.get("checkpoint") or "new") >= CHECKPOINTS.index(checkpoint)
+
+
+# Artifact column each checkpoint adds; later stages keep the earlier columns as they are.
+_ARTIFACT_COLUMNS = (("chunked", "chunks"), ("extracted", "insights"), ("enriched", "insight_rows"))
+
+
+def _checkpoint(job: dict, stage: str, cursor=None) -> None:
+    """
+    Record that job reached `stage` with the artifact it adds (chunks, insights without their chunk text,
+    enriched rows); earlier artifacts stay as stored, later ones (and all of them at "indexed" or before
+    "chunked") are cleared. Uses cursor's transaction when given (commit is the caller's), else a short
+    transaction of its own. No-op without DATABASE_URL.
+    """
+    import json
+
+    job["checkpoint"] = stage
+    if not os.environ.get("DATABASE_URL"):
+        return
+    artifact = None
+    if stage == "chunked":
+        artifact = job.get("chunks") or []
+    elif stage == "extracted":
+        artifact = [{k: v for k, v in it.items() if k != "_chunk"} for it in job.get("insights") or []]
+    elif stage == "enriched":
+        artifact = job.get("rows") or []
+    stages = [st for st, _ in _ARTIFACT_COLUMNS]
+    # Columns from this stage's own on are (re)written: its artifact, NULL for the later ones.
+    first = stages.index(stage) if stage in stages else 0
+    values = [json.dumps(artifact) if st == stage else None for st, _ in _ARTIFACT_COLUMNS]
+    updates = "".join(f", {col} = EXCLUDED.{col}" for _, col in _ARTIFACT_COLUMNS[first:])
+    sql = f"""
+        INSERT INTO video_pipeline_state (video_id, stage, prompt_set, chunks, insights, insight_rows, updated_at)
+        VALUES (%s, %s, %s, %s::jsonb, %s::jsonb, %s::jsonb, now())
+        ON CONFLICT (video_id) DO UPDATE SET stage = EXCLUDED.stage, prompt_set = EXCLUDED.prompt_set{updates},
+          error = NULL, failed_stage = NULL, updated_at = now()
+    """
+    args = (job["video_id"], stage, job.get("prompt_set"), *values)
+    if cursor is not None:
+        cursor.execute(sql, args)
+        return
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(sql, args)
+        conn.commit()
+
+
+def _record_failure(job: dict, stage_name: str, error: str) -> None:
+    """Keep the checkpoint, note which stage failed and why (shown to operators; does not block a retry)."""
+    if not os.environ.get("DATABASE_URL"):
+        return
+    try:
+        with db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO video_pipeline_state (video_id, stage, error, failed_stage, updated_at)
+                VALUES (%s, %s, %s, %s, now())
+                ON CONFLICT (video_id) DO UPDATE SET error = EXCLUDED.error, failed_stage = EXCLUDED.failed_stage, updated_at = now()
+                """,
+                (job["video_id"], job.get("checkpoint") or "new", error[:2000], stage_name),
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"  [state] {job['video_id']}: could not record failure: {e!s}", flush=True)
+
+
+def _resume(job: dict) -> None:
+    """
+    Load the video's checkpoint and artifacts into job so _run_stage skips completed stages: the stored
+    transcript once transcribed, chunks / insights / rows after chunking, extraction, enrichment.
+    """
+    if not os.environ.get("DATABASE_URL"):
+        return
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT stage, prompt_set, chunks, insights, insight_rows FROM video_pipeline_state WHERE video_id = %s",
+            (job["video_id"],),
+        )
+        row = cur.fetchone()
+        if not row or row[0] not in CHECKPOINTS or row[0] in ("new", "downloaded"):
+            return
+        stage, prompt_set, chunks, insights, rows = row
+        if stage not in ("transcribed", "indexed") and prompt_set and prompt_set != job.get("prompt_set"):
+            # Artifacts came from another prompt set: keep the transcript, redo extraction.
+            stage, chunks, insights, rows = "transcribed", None, None, None
+        stored = None
+        if stage != "indexed" and CHECKPOINTS.index(stage) < CHECKPOINTS.index("enriched"):
+            stored = _load_transcript(cur, job["video_id"])
+            if not stored:
+                # Transcript gone (e.g. deleted): start over.
+                return
+    if stored:
+        # Transcript only: the podcast passed in (e.g. --podcast) wins over the one stored on videos.
+        job.update({k: stored[k] for k in ("raw", "utterances", "timestamped")})
+    if chunks is not None:
+        job["chunks"] = chunks
+    if insights is not None:
+        texts = [c.get("text", "") for c in job.get("chunks") or []]
+        for it in insights:
+            i = it.get("_chunk_index")
+            it["_chunk"] = texts[i] if i is not None and i < len(texts) else ""
+        job["insights"] = insights
+    if rows is not None:
+        job["rows"] = rows
+    job["checkpoint"] = stage
+    if stage != "indexed":
+        print(f"  [resume] {job['video_id']} after {stage}", flush=True)
+
+
+def _run_stage(name: str, fn, job: dict) -> bool:
+    """Run one stage unless the job's checkpoint already covers it; record failures on the video's state."""
+    if _reached(job, _SKIP_AT[name]):
+        return True
+    try:
+        ok = fn(job)
+    except Exception as e:
+        _record_failure(job, name, str(e) or type(e).__name__)
+        raise
+    if not ok:
+        _record_failure(job, name, f"{name} failed")
+    return ok
+
+
+def _new_job(video_id: str, podcast: str, *, work_dir: Path | None = None, prompt_set: str = "operators") -> dict:
+    """Per-video state passed from stage to stage (see _STAGES)."""
+    video_dir = _video_work_dir(work_dir, video_id)
+    return {
+        "video_id": video_id,
+        "podcast": podcast,
+        "work_dir": video_dir,
+        "cache_root": video_dir.parent,
+        "prompt_set": prompt_set,
+    }
 
+
+def _download_to_file(job: dict) -> bool:
+    """Download (or reuse cached) audio into job['audio_path']; evicts LRU audio beyond AUDIO_CACHE_MAX_MB."""
     from audio_extractor import download_audio
-    from deepgram_client import get_raw_text, get_utterances, transcribe
-    from insight_extractor import (
-        extract_insights,
-        extract_timestamps,
-        generate_title,
-        make_framework,
+
+    video_id = job["video_id"]
+    print(f"  [audio] {video_id}", flush=True)
+    path = download_audio(
+        video_id, job["work_dir"], cache_root=job["cache_root"], expected_duration=job.get("duration_seconds")
     )
+    if not path:
+        print("  [audio] download failed", flush=True)
+        return False
+    job["audio_path"] = path
+    return True
+
+
+def _stage_download(job: dict) -> bool:
+    """
+    Ensure the video row exists, then download (or reuse cached) audio into job['audio_path'].
+    With PIPELINE_STREAM_AUDIO=1 and no cached file, nothing is downloaded: the transcribe stage streams instead.
+    """
+    from audio_extractor import audio_cache_enabled, find_cached_audio
 
-    work_dir = work_dir or Path(os.environ.get("TEMP", "/tmp"))
+    video_id = job["video_id"]
     # 1) Ensure video in DB
     db_url = os.environ.get("DATABASE_URL")
     if db_url:
-        import psycopg2
-
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        _ensure_video(cur, video_id, podcast, "", None)
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db.connection() as conn, conn.cursor() as cur:
+            _ensure_video(cur, video_id, job["podcast"], "", None)
+            conn.commit()
+            cur.execute("SELECT duration_seconds FROM videos WHERE video_id = %s", (video_id,))
+            row = cur.fetchone()
+            job["duration_seconds"] = row[0] if row else None
 
     # 2) Audio
-    print(f"  [audio] {video_id}", flush=True)
-    path = download_audio(video_id, work_dir)
-    if not path:
-        print("  [audio] download failed", flush=True)
+    if _env_flag("PIPELINE_STREAM_AUDIO") and not (
+        audio_cache_enabled() and find_cached_audio(video_id, job["work_dir"], job.get("duration_seconds"))
+    ):
+        job["stream"] = True
+        return True
+    if not _download_to_file(job):
         return False
+    _checkpoint(job, "downloaded")
+    return True
+
+
+def _split_pieces(duration_seconds: float | None) -> int:
+    """
+    Pieces for parallel split-and-stitch transcription: DEEPGRAM_SPLIT_PIECES (default 1 = off) for episodes of at
+    least DEEPGRAM_SPLIT_MIN_SEC (default 3600). Unknown duration counts as long (transcribe_split probes it).
+    """
+    try:
+        pieces = int(os.environ.get("DEEPGRAM_SPLIT_PIECES", "1"))
+        min_sec = float(os.environ.get("DEEPGRAM_SPLIT_MIN_SEC", "3600"))
+    except ValueError:
+        return 1
+    if pieces < 2 or (duration_seconds is not None and duration_seconds < min_sec):
+        return 1
+    return pieces
 
+
+SEGMENT_COLUMNS = ("transcription_id", "start_time_sec", "end_time_sec", "text", "speaker_label")
+
+
+def _segment_rows(transcription_id, utterances: list[dict]) -> list[tuple]:
+    """segments rows (SEGMENT_COLUMNS order) for utterances that have start and end times."""
+    return [
+        (transcription_id, float(u["start"]), float(u["end"]), u.get("transcript") or "", str(u.get("speaker") or ""))
+        for u in utterances
+        if u.get("start") is not None and u.get("end") is not None
+    ]
+
+
+def _stage_transcribe(job: dict) -> bool:
+    """
+    Transcribe job['audio_path'] and store transcription (with compressed Deepgram JSON) + segments. Sets raw, utterances, timestamped.
+    For streamed jobs, pipes yt-dlp straight into Deepgram; if that fails, falls back to download + file upload.
+    PIPELINE_TRANSCODE=1 re-encodes to mono Opus before upload and records the savings in job['transcode'].
+    Long files are split at silences and transcribed in parallel (see _split_pieces), with a single-request fallback.
+    """
+    from audio_extractor import release_audio, stream_audio, transcode_for_speech
+    from deepgram_client import dump_response, get_raw_text, get_utterances, transcribe, transcribe_split, transcribe_stream
+
+    video_id = job["video_id"]
     # 3) Transcribe
-    print(f"  [transcribe] {video_id}", flush=True)
-    dg = transcribe(path, punctuate=True, utterances=True, diarize=True)
+    dg = None
+    transcode = _env_flag("PIPELINE_TRANSCODE")
+    if job.get("stream"):
+        print(f"  [transcribe] {video_id} (streaming)", flush=True)
+        dg = transcribe_stream(
+            stream_audio(video_id, transcode=transcode),
+            punctuate=True, utterances=True, diarize=True,
+            content_type="audio/ogg" if transcode else None,  # None: sniffed (bestaudio may be webm or m4a)
+        )
+        if not get_raw_text(dg):
+            print("  [transcribe] streaming failed; falling back to download", flush=True)
+            dg = None
+            if not _download_to_file(job):
+                return False
+    if dg is None:
+        upload_path = job["audio_path"]
+        speech = transcode_for_speech(upload_path) if transcode else None
+        if speech:
+            upload_path, job["transcode"] = speech
+            st = job["transcode"]
+            print(
+                f"  [transcode] {st['original_bytes'] // 1024} KiB -> {st['compressed_bytes'] // 1024} KiB "
+                f"(saved {st['saved_bytes'] // 1024} KiB, ~{st['est_upload_saved_sec']}s upload)",
+                flush=True,
+            )
+        t0 = time.monotonic()
+        pieces = _split_pieces(job.get("duration_seconds"))
+        if pieces > 1:
+            print(f"  [transcribe] {video_id} ({pieces} pieces)", flush=True)
+            dg = transcribe_split(
+                upload_path, pieces=pieces, duration=job.get("duration_seconds"),
+                punctuate=True, utterances=True, diarize=True,
+            )
+        if not get_raw_text(dg):
+            print(f"  [transcribe] {video_id}", flush=True)
+            dg = transcribe(upload_path, punctuate=True, utterances=True, diarize=True)
+        if speech:
+            job["transcode"]["transcribe_sec"] = round(time.monotonic() - t0, 1)
+            Path(upload_path).unlink(missing_ok=True)
     raw = get_raw_text(dg)
     utterances = get_utterances(dg)
     if not raw:
         print("  [transcribe] empty", flush=True)
+        release_audio(job.get("audio_path"), delete=False)
         return False
+    # Audio is no longer needed by this run: unpin it (and delete it unless AUDIO_CACHE is on).
+    release_audio(job.get("audio_path"))
 
-    timestamped = _format_timestamped(utterances) if utterances else raw
+    job["raw"] = raw
+    job["utterances"] = utterances
+    job["timestamped"] = _format_timestamped(utterances) if utterances else raw
 
     # 4) Store transcription (and optionally segments)
+    db_url = os.environ.get("DATABASE_URL")
     if db_url:
         import psycopg2
 
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM transcriptions WHERE video_id = %s", (video_id,))
-        cur.execute(
-            "INSERT INTO transcriptions (video_id, raw_text) VALUES (%s, %s) RETURNING id",
-            (video_id, raw),
-        )
-        trans_id = cur.fetchone()[0]
-        for u in utterances:
-            st, et = u.get("start"), u.get("end")
-            if st is not None and et is not None:
-                cur.execute(
-                    "INSERT INTO segments (transcription_id, start_time_sec, end_time_sec, text, speaker_label) VALUES (%s,%s,%s,%s,%s)",
-                    (trans_id, float(st), float(et), (u.get("transcript") or ""), str(u.get("speaker") or "")),
-                )
-        conn.commit()
+        with db.connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM transcriptions WHERE video_id = %s", (video_id,))
+            cur.execute(
+                "INSERT INTO transcriptions (video_id, raw_text, deepgram_json_gz) VALUES (%s, %s, %s) RETURNING id",
+                (video_id, raw, psycopg2.Binary(dump_response(dg))),
+            )
+            trans_id = cur.fetchone()[0]
+            db.copy_rows(cur, "segments", SEGMENT_COLUMNS, _segment_rows(trans_id, utterances))
+            _checkpoint(job, "transcribed", cur)
+            conn.commit()
+    return True
+
+
+def _stage_extract(job: dict) -> bool:
+    """
+    Chunk the transcript and run insight extraction per chunk (concurrently) into job['insights'].
+    With utterances, chunks keep their time range (job['chunks']) and each insight records its "_chunk_index".
+    INSIGHT_BATCHED=1 uses extract_insights_batched, so most insights arrive with timestamps and framework filled in.
+    """
+    from insight_extractor import extract_insights, extract_insights_batched, extract_insights_many, run_llm_calls
 
-    # 5) Chunk and extract insights
-    chunks = _chunk_text(raw, size=6000, overlap=500)
+    # 5) Chunk (unless resuming after "chunked") and extract insights (chunks run concurrently, results kept in chunk order)
+    if not _reached(job, "chunked"):
+        if job.get("utterances"):
+            job["chunks"] = _chunk_utterances(job["utterances"], size=6000, overlap=500)
+        else:
+            job["chunks"] = [{"text": ch, "start_sec": None, "end_sec": None} for ch in _chunk_text(job["raw"], size=6000, overlap=500)]
+        _checkpoint(job, "chunked")
+    chunks = job["chunks"]
+    texts = [ch["text"] for ch in chunks]
+    prompt_set = job["prompt_set"]
+    if _env_flag("INSIGHT_BATCHED"):
+        # One structured call per chunk (title, timestamps, framework included); plain extraction if unparseable.
+        def batched(i: int) -> list[dict]:
+            print(f"  [insights] chunk {i+1}/{len(chunks)} (batched)", flush=True)
+            ch = chunks[i]
+            window = _timestamped_window(job["utterances"], ch["start_sec"], ch["end_sec"], 0) if job.get("utterances") else ch["text"]
+            items = extract_insights_batched(window, prompt_set=prompt_set)
+            if items is None:
+                return extract_insights(ch["text"], prompt_set=prompt_set)
+            return items
+
+        per_chunk = run_llm_calls([lambda i=i: batched(i) for i in range(len(chunks))])
+    else:
+        per_chunk = extract_insights_many(texts, prompt_set=prompt_set)
     all_insights: list[dict] = []
-    for i, ch in enumerate(chunks):
-        print(f"  [insights] chunk {i+1}/{len(chunks)}", flush=True)
-        items = extract_insights(ch, prompt_set=prompt_set)
+    for i, items in enumerate(per_chunk):
         for it in items:
-            it["_chunk"] = ch
+            it["_chunk"] = texts[i]
+            it["_chunk_index"] = i
             all_insights.append(it)
+    job["insights"] = all_insights
+    _checkpoint(job, "extracted")
+    return True
+
+
+def _enrich_insight(it: dict, timestamped: str, prompt_set: str, align_index=None) -> dict:
+    """
+    Title (if missing/too long), timestamps and framework (Frameworks and exercises) for one extracted insight.
+    Fields already returned by batched extraction (start/end_time_sec, framework_markdown) are kept; otherwise
+    timestamps come from align_index (timestamp_aligner.TranscriptIndex) when the match is confident,
+    else from the LLM. "_ts_source" on the row records which: batched | local | llm.
+    """
+    from insight_extractor import extract_timestamps, generate_title, make_framework
+    from timestamp_aligner import MIN_CONFIDENCE
+
+    cat = it.get("category") or ""
+    title = (it.get("title") or "").strip()
+    desc = (it.get("description") or "").strip()
+    # generate title if missing or short
+    if len(title) < 3:
+        title = generate_title(desc or title, prompt_set=prompt_set)
+    elif len(title) > 120:
+        title = generate_title(desc or title, prompt_set=prompt_set)
+    # timestamps: from batched extraction, else local alignment (quote/description, then titles), LLM only when unsure
+    start_sec, end_sec = it.get("start_time_sec"), it.get("end_time_sec")
+    ts_source = "batched"
+    if start_sec is None or end_sec is None:
+        hit = align_index.align_best([desc, it.get("title") or "", title]) if align_index is not None else None
+        if hit and hit[2] >= MIN_CONFIDENCE:
+            start_sec, end_sec = hit[0], hit[1]
+            ts_source = "local"
+        else:
+            start_sec, end_sec = extract_timestamps(timestamped, desc or title, prompt_set=prompt_set)
+            ts_source = "llm"
+    # framework for Frameworks and exercises
+    fw = it.get("framework_markdown") or ""
+    if not fw and ("ramework" in cat or cat == "Frameworks and exercises"):
+        fw = make_framework(title or "Framework", it.get("_chunk", ""), prompt_set=prompt_set)
+    return {
+        "category": cat,
+        "title": title,
+        "description": desc,
+        "start_time_sec": start_sec,
+        "end_time_sec": end_sec,
+        "framework_markdown": fw or None,
+        "source_chunk": (it.get("_chunk") or "")[:8000],
+        "_ts_source": ts_source,
+    }
+
+
+INSIGHT_COLUMNS = (
+    "id", "video_id", "podcast", "category", "title", "description",
+    "start_time_sec", "end_time_sec", "framework_markdown", "source_chunk",
+)
+
+
+def _stage_enrich(job: dict) -> bool:
+    """
+    Title, timestamps and framework per insight (concurrently), entirely in memory: job['rows'] gets the
+    insights rows (with ids) ready for _stage_store. No database connection is held during the LLM calls.
+    """
+    import uuid
+
+    from insight_extractor import run_llm_calls
+
+    prompt_set = job["prompt_set"]
+    timestamped = job.get("timestamped") or ""
+    all_insights = job.get("insights") or []
+
+    align_index = None
+    if job.get("utterances") and _env_flag("ALIGN_TIMESTAMPS", default=True):
+        from timestamp_aligner import TranscriptIndex
+
+        align_index = TranscriptIndex(job["utterances"])
+    # LLM timestamp fallback only sees the originating chunk's time window (plus margin), not the whole episode.
+    windows: dict[int, str] = {}
+    chunks = job.get("chunks") or []
+    for it in all_insights:
+        i = it.get("_chunk_index")
+        if i is not None and i not in windows and i < len(chunks) and job.get("utterances"):
+            windows[i] = _timestamped_window(job["utterances"], chunks[i].get("start_sec"), chunks[i].get("end_sec"))
+    enriched = run_llm_calls([
+        lambda it=it: _enrich_insight(it, windows.get(it.get("_chunk_index")) or timestamped, prompt_set, align_index)
+        for it in all_insights
+    ])
+    sources = [row.pop("_ts_source") for row in enriched]
+    if enriched:
+        counts = ", ".join(f"{k}={sources.count(k)}" for k in ("batched", "local", "llm") if k in sources)
+        print(f"  [timestamps] {counts}", flush=True)
+    job["rows"] = [
+        {"id": str(uuid.uuid4()), "video_id": job["video_id"], "podcast": job["podcast"], **row} for row in enriched
+    ]
+    _checkpoint(job, "enriched")
+    return True
+
+
+def _stage_store(job: dict) -> bool:
+    """
+    Replace the video's insights with job['rows'] in one short transaction (DELETE + bulk INSERT + search_outbox
+    row); the outbox syncer pushes them to Meilisearch. Without DATABASE_URL, rows are indexed directly.
+    Everything slow already happened in _stage_enrich.
+    """
+    from search_index import enqueue, index_rows
+
+    video_id = job["video_id"]
+    rows = job.get("rows") or []
+
+    if os.environ.get("DATABASE_URL"):
+        with db.connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM insights WHERE video_id = %s", (video_id,))
+            db.insert_rows(cur, "insights", INSIGHT_COLUMNS, [tuple(r[c] for c in INSIGHT_COLUMNS) for r in rows])
+            enqueue(cur, [video_id])
+            _checkpoint(job, "indexed", cur)
+            conn.commit()
+    else:
+        try:
+            index_rows(rows)
+        except Exception as e:
+            print(f"  [search] {video_id}: indexing failed: {e!s}", flush=True)
+            return False
+
+    print(f"  [done] {video_id} insights={len(rows)}", flush=True)
+    return True
+
+
+# Stage order for _process_one and process_staged: (name, fn). Each fn takes the job dict and returns ok.
+_STAGES = (
+    ("download", _stage_download),
+    ("transcribe", _stage_transcribe),
+    ("extract", _stage_extract),
+    ("enrich", _stage_enrich),
+    ("store", _stage_store),
+)
+
 
-    # 6) For each: title, timestamps, framework (if Frameworks and exercises); insert; Meilisearch
-    ms_host = os.environ.get("MEILISEARCH_HOST")
-    ms_key = os.environ.get("MEILISEARCH_API_KEY")
-    ms_client = None
-    if ms_host and ms_key:
+def _process_one(
+    video_id: str,
+    podcast: str,
+    *,
+    work_dir: Path | None = None,
+    prompt_set: str = "operators",
+    restart: bool = False,
+) -> bool:
+    """Run every stage for one video, resuming after its last checkpoint (restart=True starts from scratch)."""
+    job = _new_job(video_id, podcast, work_dir=work_dir, prompt_set=prompt_set)
+    if not restart:
+        _resume(job)
+    if _reached(job, "indexed"):
+        print(f"  [skip] {video_id} already indexed (use --restart to reprocess)", flush=True)
+        return True
+    for name, fn in _STAGES:
+        if not _run_stage(name, fn, job):
+            return False
+    return True
+
+
+def _parse_stage_workers(spec: str | None) -> dict[str, int]:
+    """'download=2,transcribe=2,extract=3,enrich=3,store=1' -> {stage: n}. Unknown stages and bad numbers are ignored."""
+    out: dict[str, int] = {}
+    names = {name for name, _ in _STAGES}
+    for part in (spec or "").split(","):
+        k, _, v = part.partition("=")
+        k = k.strip()
+        if k in names:
+            try:
+                out[k] = max(1, int(v))
+            except ValueError:
+                continue
+    return out
+
+
+def process_staged(
+    rows: list[tuple[str, str]],
+    *,
+    work_dir: Path | None = None,
+    prompt_set: str = "operators",
+    stage_workers: dict[str, int] | None = None,
+    queue_size: int | None = None,
+) -> dict:
+    """
+    Process videos as a stage pipeline: download -> transcribe -> extract -> enrich -> store, each stage with its own
+    thread count and a bounded queue (queue_size, default PIPELINE_QUEUE_SIZE or 2) in front of the next,
+    so downloads, Deepgram uploads and LLM calls for different videos overlap.
+    stage_workers defaults to PIPELINE_STAGE_WORKERS (e.g. "download=2,transcribe=2,extract=3,enrich=3,store=1"); missing stages get 1.
+    Returns the same shape as process_many.
+    """
+    import queue
+    import threading
+
+    workers = _parse_stage_workers(os.environ.get("PIPELINE_STAGE_WORKERS"))
+    workers.update(stage_workers or {})
+    if queue_size is None:
         try:
-            from meilisearch import Client as MeiliClient
+            queue_size = int(os.environ.get("PIPELINE_QUEUE_SIZE", "2"))
+        except ValueError:
+            queue_size = 2
+    queue_size = max(1, queue_size)
 
-            ms_client = MeiliClient(ms_host, ms_key)
-            idx = ms_client.index("operators_insights")
+    done = object()
+    total = len(rows)
+    # queues[k] feeds stage k; the first is unbounded so the feeder never blocks.
+    queues: list[queue.Queue] = [queue.Queue()] + [queue.Queue(maxsize=queue_size) for _ in _STAGES[1:]]
+    results: dict[str, bool] = {}
+    lock = threading.Lock()
+    remaining = [workers.get(name, 1) for name, _ in _STAGES]
+
+    def stage_loop(k: int) -> None:
+        name, fn = _STAGES[k]
+        q_in = queues[k]
+        while True:
+            job = q_in.get()
+            if job is done:
+                break
             try:
-                idx.update_filterable_attributes(["podcast", "category", "video_id"])
-                idx.update_searchable_attributes(["title", "description", "framework_markdown"])
-                idx.update_sortable_attributes(["start_time_sec", "title", "category"])
-            except Exception:
-                pass
-        except Exception:
-            ms_client = None
+                ok = _run_stage(name, fn, job)
+            except Exception as e:
+                print(f"  [error] {job['video_id']} ({name}): {e!s}", flush=True)
+                ok = False
+            if ok and k + 1 < len(_STAGES):
+                queues[k + 1].put(job)
+            else:
+                with lock:
+                    results[job["video_id"]] = ok
+        with lock:
+            remaining[k] -= 1
+            last = remaining[k] == 0
+        if last and k + 1 < len(_STAGES):
+            for _ in range(workers.get(_STAGES[k + 1][0], 1)):
+                queues[k + 1].put(done)
+
+    threads = []
+    for k, (name, _) in enumerate(_STAGES):
+        for n in range(workers.get(name, 1)):
+            t = threading.Thread(target=stage_loop, args=(k,), name=f"pipeline-{name}-{n}", daemon=True)
+            t.start()
+            threads.append(t)
+    for i, (vid, pod) in enumerate(rows):
+        print(f"[{i+1}/{total}] {vid} ({pod})", flush=True)
+        job = _new_job(vid, pod, work_dir=work_dir, prompt_set=prompt_set)
+        try:
+            _resume(job)
+        except Exception as e:
+            print(f"  [resume] {vid}: could not load checkpoint, starting over: {e!s}", flush=True)
+        queues[0].put(job)
+    for _ in range(workers.get(_STAGES[0][0], 1)):
+        queues[0].put(done)
+    for t in threads:
+        t.join()
+
+    processed = [vid for vid, _ in rows if results.get(vid)]
+    failed = [vid for vid, _ in rows if not results.get(vid)]
+    return {"processed": len(processed), "failed": len(failed), "video_ids": processed, "failed_ids": failed}
 
-    if db_url:
-        import psycopg2
 
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM insights WHERE video_id = %s", (video_id,))
+def _load_transcript(cursor, video_id: str) -> dict | None:
+    """
+    Rebuild {podcast, raw, utterances, timestamped} for a video from storage: the stored Deepgram JSON when present,
+    else transcriptions.raw_text + segments. None if the video has no transcription.
+    """
+    from deepgram_client import get_raw_text, get_utterances, load_response
+
+    cursor.execute(
+        """
+        SELECT t.id, t.raw_text, t.deepgram_json_gz, v.podcast FROM transcriptions t
+        JOIN videos v ON v.video_id = t.video_id
+        WHERE t.video_id = %s ORDER BY t.created_at DESC LIMIT 1
+        """,
+        (video_id,),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    trans_id, raw, blob, podcast = row
+    dg = load_response(blob)
+    if dg:
+        raw = get_raw_text(dg) or raw
+        utterances = get_utterances(dg)
     else:
-        conn = None
-        cur = None
-
-    for j, it in enumerate(all_insights):
-        cat = it.get("category") or ""
-        title = (it.get("title") or "").strip()
-        desc = (it.get("description") or "").strip()
-        # generate title if missing or short
-        if len(title) < 3:
-            title = generate_title(desc or title, prompt_set=prompt_set)
-        elif len(title) > 120:
-            title = generate_title(desc or title, prompt_set=prompt_set)
-        # timestamps
-        start_sec, end_sec = extract_timestamps(timestamped, desc or title, prompt_set=prompt_set)
-        # framework for Frameworks and exercises
-        fw = ""
-        if "ramework" in cat or cat == "Frameworks and exercises":
-            fw = make_framework(title or "Framework", it.get("_chunk", ""), prompt_set=prompt_set)
-        ins_id = str(uuid.uuid4())
-        if cur:
-            cur.execute(
-                """
-                INSERT INTO insights (id, video_id, podcast, category, title, description, start_time_sec, end_time_sec, framework_markdown, source_chunk)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (ins_id, video_id, podcast, cat, title, desc, start_sec, end_sec, fw or None, (it.get("_chunk") or "")[:8000]),
-            )
-        if ms_client:
-            doc = {
-                "id": ins_id,
-                "video_id": video_id,
-                "podcast": podcast,
-                "category": cat,
-                "title": title,
-                "description": desc,
-                "start_time_sec": start_sec,
-                "end_time_sec": end_sec,
-                "framework_markdown": fw or None,
+        cursor.execute(
+            "SELECT start_time_sec, end_time_sec, text, speaker_label FROM segments WHERE transcription_id = %s ORDER BY start_time_sec",
+            (trans_id,),
+        )
+        utterances = [
+            {
+                "start": float(r[0]),
+                "end": float(r[1]),
+                "transcript": r[2] or "",
+                "speaker": int(r[3]) if (r[3] or "").isdigit() else (r[3] or None),
             }
-            try:
-                ms_client.index("operators_insights").add_documents([doc])
-            except Exception:
-                pass
+            for r in cursor.fetchall()
+        ]
+    if not raw:
+        return None
+    return {
+        "podcast": podcast,
+        "raw": raw,
+        "utterances": utterances,
+        "timestamped": _format_timestamped(utterances) if utterances else raw,
+    }
 
-    if conn:
-        conn.commit()
-        cur.close()
-        conn.close()
 
-    print(f"  [done] {video_id} insights={len(all_insights)}", flush=True)
+def _reextract_one(video_id: str, *, prompt_set: str = "operators") -> bool:
+    """Re-run chunking + insight extraction + store for a video from its stored transcript (no download/transcribe)."""
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        print("DATABASE_URL not set; cannot reextract.", flush=True)
+        return False
+    with db.connection() as conn, conn.cursor() as cur:
+        stored = _load_transcript(cur, video_id)
+    if not stored:
+        print(f"  [reextract] {video_id}: no stored transcription", flush=True)
+        return False
+    job = _new_job(video_id, stored["podcast"], prompt_set=prompt_set)
+    job.update(stored)
+    _checkpoint(job, "transcribed")
+    for name, fn in _STAGES:
+        if not _run_stage(name, fn, job):
+            return False
     return True
 
 
+def _get_transcribed(cursor) -> list[tuple[str, str]]:
+    """Return (video_id, podcast) for every video that has a stored transcription."""
+    cursor.execute(
+        """
+        SELECT v.video_id, v.podcast FROM videos v
+        WHERE EXISTS (SELECT 1 FROM transcriptions t WHERE t.video_id = v.video_id)
+        ORDER BY v.published_at DESC NULLS LAST, v.created_at DESC
+        """
+    )
+    return [(r[0], r[1]) for r in cursor.fetchall()]
+
+
+def _run_pool(rows: list[tuple[str, str | None]], fn, workers: int) -> dict:
+    """Call fn(video_id, podcast) -> bool for each row on up to `workers` threads; aggregate like process_many."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    total = len(rows)
+
+    def run(i: int, vid: str, pod: str | None) -> bool:
+        print(f"[{i+1}/{total}] {vid}" + (f" ({pod})" if pod else ""), flush=True)
+        try:
+            return fn(vid, pod)
+        except Exception as e:
+            print(f"  [error] {vid}: {e!s}", flush=True)
+            return False
+
+    if workers == 1 or total <= 1:
+        results = [run(i, vid, pod) for i, (vid, pod) in enumerate(rows)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, total), thread_name_prefix="pipeline") as ex:
+            futures = [ex.submit(run, i, vid, pod) for i, (vid, pod) in enumerate(rows)]
+            results = [f.result() for f in futures]
+
+    processed = [vid for (vid, _), ok in zip(rows, results) if ok]
+    failed = [vid for (vid, _), ok in zip(rows, results) if not ok]
+    return {"processed": len(processed), "failed": len(failed), "video_ids": processed, "failed_ids": failed}
+
+
+def reextract_many(
+    video_ids: list[str] | None = None,
+    *,
+    prompt_set: str = "operators",
+    workers: int | None = None,
+) -> dict:
+    """
+    Re-extract insights from stored transcripts for video_ids (None = every transcribed video) on `workers`
+    threads (default: PIPELINE_CONCURRENCY). A requested video without a stored transcript counts as failed.
+    Returns the same shape as process_many. Raises on missing DATABASE_URL.
+    """
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        raise ValueError("DATABASE_URL not set")
+    with db.connection() as conn, conn.cursor() as cur:
+        if video_ids is not None:
+            ids = list(dict.fromkeys(video_ids))
+            cur.execute("SELECT video_id, podcast FROM videos WHERE video_id = ANY(%s)", (ids,))
+            podcasts = dict(cur.fetchall())
+            rows = [(vid, podcasts.get(vid)) for vid in ids]
+        else:
+            rows = _get_transcribed(cur)
+    workers = max(1, workers or _default_workers())
+    return _run_pool(rows, lambda vid, pod: _reextract_one(vid, prompt_set=prompt_set), workers)
+
+
+def process_many(
+    rows: list[tuple[str, str]],
+    *,
+    work_dir: Path | None = None,
+    prompt_set: str = "operators",
+    workers: int | None = None,
+    staged: bool | None = None,
+    stage_workers: dict[str, int] | None = None,
+) -> dict:
+    """
+    Run _process_one for each (video_id, podcast) with a pool of `workers` threads (default: PIPELINE_CONCURRENCY).
+    Each video gets its own work dir under work_dir. A failing video never stops the batch.
+    With staged (default: PIPELINE_STAGED), delegates to process_staged with per-stage stage_workers instead.
+    Returns {processed, failed, video_ids, failed_ids}; ids keep the order of rows.
+    """
+    if staged is None:
+        staged = _env_flag("PIPELINE_STAGED")
+    if staged:
+        return process_staged(rows, work_dir=work_dir, prompt_set=prompt_set, stage_workers=stage_workers)
+
+    workers = max(1, workers or _default_workers())
+    return _run_pool(rows, lambda vid, pod: _process_one(vid, pod, work_dir=work_dir, prompt_set=prompt_set), workers)
+
+
 def run_seed_and_process_all(
     *,
     paths_override: dict[str, str] | None = None,
@@ -364,45 +1195,66 @@ def run_seed_and_process_all(
     from_db: bool = False,
     work_dir: Path | None = None,
     prompt_set: str = "operators",
+    workers: int | None = None,
+    staged: bool | None = None,
+    stage_workers: dict[str, int] | None = None,
 ) -> dict:
     """
-    Seed then process unprocessed videos. Returns {seeded, processed, video_ids}.
+    Seed then process unprocessed videos. Returns {seeded, seed_counts, processed, failed, video_ids, failed_ids}
+    (seed_counts = inserted / updated / unchanged videos).
     - seed_link_rows: upsert into seed_links, then seed-from-db and process-new.
     - from_db: seed from seed_links into videos, then process-new.
     - else: seed from CSVs (paths_override or DEFAULT_CSV_PATHS) into videos, then process-new.
+    Videos are processed by process_many with `workers` threads (default: PIPELINE_CONCURRENCY), or staged.
     Raises on missing DATABASE_URL.
     """
-    import psycopg2
-
     db_url = os.environ.get("DATABASE_URL")
     if not db_url:
         raise ValueError("DATABASE_URL not set")
 
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    seeded: int = 0
-    if seed_link_rows:
-        upsert_seed_links(cur, seed_link_rows)
-        conn.commit()
-        seeded = _seed_from_db(cur)
-        conn.commit()
-    elif from_db:
-        seeded = _seed_from_db(cur)
-        conn.commit()
-    else:
-        seeded = _seed_csvs(cur, paths_override=paths_override)
-        conn.commit()
+    with db.connection() as conn, conn.cursor() as cur:
+        if seed_link_rows:
+            upsert_seed_links(cur, seed_link_rows)
+            conn.commit()
+            counts = _seed_from_db(cur)
+            conn.commit()
+        elif from_db:
+            counts = _seed_from_db(cur)
+            conn.commit()
+        else:
+            counts = _seed_csvs(cur, paths_override=paths_override)
+            conn.commit()
+
+        rows = _get_unprocessed(cur)
+
+    out = process_many(
+        rows, work_dir=work_dir, prompt_set=prompt_set, workers=workers, staged=staged, stage_workers=stage_workers
+    )
+    seed_counts = {k: counts[k] for k in ("inserted", "updated", "unchanged")}
+    return {"seeded": counts["upserted"], "seed_counts": seed_counts, **out}
 
-    rows = _get_unprocessed(cur)
-    cur.close()
-    conn.close()
 
-    processed = []
-    for vid, pod in rows:
-        ok = _process_one(vid, pod, work_dir=work_dir, prompt_set=prompt_set)
-        if ok:
-            processed.append(vid)
-    return {"seeded": seeded, "processed": len(processed), "video_ids": processed}
+def _sync_search_outbox() -> None:
+    """Drain the search outbox once (CLI runs have no background syncer); failures stay queued for retry."""
+    from search_index import drain_outbox, get_client
+
+    if not os.environ.get("DATABASE_URL") or get_client() is None:
+        return
+    try:
+        out = drain_outbox()
+    except Exception as e:
+        print(f"Search outbox: sync failed, left queued: {e!s}", flush=True)
+        return
+    if out["claimed"]:
+        print(f"Search outbox: indexed {out['docs']} docs for {out['videos']} videos; {out['failed']} rows to retry.", flush=True)
+
+
+def _print_llm_cache_stats() -> None:
+    from llm_cache import cache_stats
+
+    st = cache_stats()
+    if st:
+        print(f"LLM cache: {st['hits']} hits, {st['misses']} misses ({st['entries']} entries, {st['bytes'] // 1024} KiB).", flush=True)
 
 
 def main() -> int:
@@ -412,28 +1264,40 @@ def main() -> int:
     ap.add_argument("--seed-from-db", action="store_true", help="Upsert from seed_links into videos; use with --process-new to run backfill from DB")
     ap.add_argument("--process-all", action="store_true", help="After --seed-csvs or --seed-from-db, process unprocessed videos (audio->transcribe->extract->store)")
     ap.add_argument("--process", metavar="VIDEO_ID", help="Process one video: download audio, transcribe, extract insights, store")
+    ap.add_argument("--restart", action="store_true", help="With --process: ignore the video's checkpoint and run every stage again")
     ap.add_argument("--podcast", default="9operators", choices=("9operators", "marketing_operator", "finance_operators"), help="For --process when video not in DB")
     ap.add_argument("--fetch-new", action="store_true", help="Fetch new videos from YouTube channels (9 Operators, Marketing, Finance) and upsert into videos. Requires YOUTUBE_API_KEY.")
-    ap.add_argument("--process-new", action="store_true", help="Process videos that have no transcription yet (audio->transcribe->extract->store)")
+    ap.add_argument("--full-history", action="store_true", help="With --fetch-new: page each channel's whole upload history instead of stopping at its watermark")
+    ap.add_argument("--process-new", action="store_true", help="Process videos not yet indexed, resuming after each one's last checkpoint (audio->transcribe->extract->store)")
     ap.add_argument("--work-dir", default=None, help="Temp dir for audio (default: TEMP)")
     ap.add_argument("--prompt-set", default="operators", help="Prompt set under prompts/ (default: operators)")
+    ap.add_argument("--workers", type=int, default=None, help="Videos processed concurrently by --process-new/--process-all (default: PIPELINE_CONCURRENCY or 1)")
+    ap.add_argument("--staged", action="store_true", default=None, help="Batch runs as a stage pipeline (download/transcribe/extract/store overlap across videos). Default: PIPELINE_STAGED")
+    ap.add_argument("--stage-workers", default=None, metavar="SPEC", help="Per-stage threads for --staged, e.g. download=2,transcribe=2,extract=3,enrich=3,store=1 (default: PIPELINE_STAGE_WORKERS)")
+    ap.add_argument("--reextract", metavar="VIDEO_ID|all", help="Re-run chunking + insight extraction from the stored transcript (no download/transcribe); 'all' = every transcribed video")
+    ap.add_argument("--sync-outbox", action="store_true", help="Push queued insights (search_outbox) to Meilisearch and exit; failed rows stay queued with backoff")
+    ap.add_argument("--reindex", action="store_true", help="Rebuild the Meilisearch index from the insights table into a temp index and swap it in (search stays live)")
+    ap.add_argument("--reindex-batch-size", type=int, default=None, help="Docs per add_documents call for --reindex (default: MEILI_BATCH_SIZE or 1000)")
+    ap.add_argument("--worker", action="store_true", help="Run a worker that drains the pipeline_jobs queue (same jobs as the API's async endpoints) until interrupted; --workers sets its threads")
+    ap.add_argument("--no-llm-cache", action="store_true", help="Bypass the LLM response cache (same as LLM_CACHE=0)")
     args = ap.parse_args()
 
+    if args.no_llm_cache:
+        from llm_cache import set_bypass
+
+        set_bypass(True)
     work_dir = Path(args.work_dir) if args.work_dir else None
+    batch = {"workers": args.workers, "staged": args.staged, "stage_workers": _parse_stage_workers(args.stage_workers) or None}
     db_url = os.environ.get("DATABASE_URL")
 
     if args.seed_csvs_to_db:
         if not db_url:
             print("DATABASE_URL not set; cannot seed-csvs-to-db.", flush=True)
             return 1
-        import psycopg2
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        n = _seed_csvs_to_db(cur, paths_override=None)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"Upserted {n} rows into seed_links.", flush=True)
+        with db.connection() as conn, conn.cursor() as cur:
+            counts = _seed_csvs_to_db(cur, paths_override=None)
+            conn.commit()
+        print(f"Upserted {counts['upserted']} rows into seed_links ({db.count_summary(counts)}).", flush=True)
         return 0
 
     if args.seed_from_db:
@@ -441,17 +1305,14 @@ def main() -> int:
             print("DATABASE_URL not set; cannot seed-from-db.", flush=True)
             return 1
         if args.process_all:
-            out = run_seed_and_process_all(from_db=True, work_dir=work_dir, prompt_set=args.prompt_set)
-            print(f"Seeded {out['seeded']} from seed_links; processed {out['processed']}.", flush=True)
+            out = run_seed_and_process_all(from_db=True, work_dir=work_dir, prompt_set=args.prompt_set, **batch)
+            print(f"Seeded {out['seeded']} from seed_links; processed {out['processed']}, failed {out['failed']}.", flush=True)
+            _sync_search_outbox()
             return 0
-        import psycopg2
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        n = _seed_from_db(cur)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"Seeded {n} videos from seed_links.", flush=True)
+        with db.connection() as conn, conn.cursor() as cur:
+            counts = _seed_from_db(cur)
+            conn.commit()
+        print(f"Seeded {counts['upserted']} videos from seed_links ({db.count_summary(counts)}).", flush=True)
         return 0
 
     if args.seed_csvs:
@@ -459,22 +1320,81 @@ def main() -> int:
             print("DATABASE_URL not set; cannot seed.", flush=True)
             return 1
         if args.process_all:
-            out = run_seed_and_process_all(paths_override=None, work_dir=work_dir, prompt_set=args.prompt_set)
-            print(f"Seeded {out['seeded']} videos; processed {out['processed']}.", flush=True)
+            out = run_seed_and_process_all(paths_override=None, work_dir=work_dir, prompt_set=args.prompt_set, **batch)
+            print(f"Seeded {out['seeded']} videos; processed {out['processed']}, failed {out['failed']}.", flush=True)
+            _sync_search_outbox()
             return 0
-        import psycopg2
+        with db.connection() as conn, conn.cursor() as cur:
+            counts = _seed_csvs(cur, paths_override=None)
+            conn.commit()
+        print(f"Seeded {counts['upserted']} videos ({db.count_summary(counts)}).", flush=True)
+        return 0
 
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        n = _seed_csvs(cur, paths_override=None)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"Seeded {n} videos.", flush=True)
+    if args.worker:
+        if not db_url:
+            print("DATABASE_URL not set; cannot run worker.", flush=True)
+            return 1
+        from jobs import Worker
+        from search_index import OutboxSyncer, get_client
+
+        syncer = None
+        if get_client() is not None and os.environ.get("OUTBOX_SYNC", "1").strip().lower() not in ("0", "false", "no", "off"):
+            syncer = OutboxSyncer()
+            syncer.start()
+        w = Worker(concurrency=args.workers)
+        print(f"Worker {w.worker_id}: {w.concurrency} threads, polling pipeline_jobs every {w.poll_sec}s.", flush=True)
+        w.run_forever()
+        if syncer:
+            syncer.stop()
+        return 0
+
+    if args.sync_outbox:
+        if not db_url:
+            print("DATABASE_URL not set; cannot sync-outbox.", flush=True)
+            return 1
+        from search_index import get_client
+
+        if get_client() is None:
+            print("MEILISEARCH_HOST / MEILISEARCH_API_KEY not set; cannot sync-outbox.", flush=True)
+            return 1
+        _sync_search_outbox()
+        return 0
+
+    if args.reindex:
+        if not db_url:
+            print("DATABASE_URL not set; cannot reindex.", flush=True)
+            return 1
+        from search_index import get_client, reindex_all
+
+        if get_client() is None:
+            print("MEILISEARCH_HOST / MEILISEARCH_API_KEY not set; cannot reindex.", flush=True)
+            return 1
+        last = [0.0]
+
+        def progress(p: dict) -> None:
+            if p["phase"] != "indexing" or time.monotonic() - last[0] >= 2:
+                last[0] = time.monotonic()
+                print(f"  [reindex] {p['phase']}: {p['docs']} docs, {p['elapsed_sec']}s, {p['docs_per_sec']} docs/s", flush=True)
+
+        out = reindex_all(batch_size=args.reindex_batch_size, progress=progress)
+        print(f"Reindexed {out['docs']} docs in {out['elapsed_sec']}s; re-queued {out.get('requeued_videos', 0)} videos written meanwhile.", flush=True)
         return 0
 
+    if args.reextract:
+        if not db_url:
+            print("DATABASE_URL not set; cannot reextract.", flush=True)
+            return 1
+        ids = None if args.reextract == "all" else [args.reextract]
+        out = reextract_many(ids, prompt_set=args.prompt_set, workers=args.workers)
+        print(f"Re-extracted {out['processed']}, failed {out['failed']}.", flush=True)
+        _sync_search_outbox()
+        _print_llm_cache_stats()
+        return 0 if not out["failed"] else 1
+
     if args.process:
-        ok = _process_one(args.process, args.podcast, work_dir=work_dir, prompt_set=args.prompt_set)
+        ok = _process_one(args.process, args.podcast, work_dir=work_dir, prompt_set=args.prompt_set, restart=args.restart)
+        _sync_search_outbox()
+        _print_llm_cache_stats()
         return 0 if ok else 1
 
     if args.fetch_new:
@@ -484,15 +1404,10 @@ def main() -> int:
         if not os.environ.get("YOUTUBE_API_KEY"):
             print("YOUTUBE_API_KEY not set; required for --fetch-new.", flush=True)
             return 1
-        import psycopg2
-
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        n = _fetch_new(cur)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"Fetch-new: {n} videos upserted.", flush=True)
+        with db.connection() as conn, conn.cursor() as cur:
+            counts = _fetch_new(cur, full_history=args.full_history)
+            conn.commit()
+        print(f"Fetch-new: {counts['upserted']} videos upserted ({db.count_summary(counts)}).", flush=True)
         if not args.process_new:
             return 0
 
@@ -500,19 +1415,15 @@ def main() -> int:
         if not db_url:
             print("DATABASE_URL not set; cannot process-new.", flush=True)
             return 1
-        import psycopg2
-
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        rows = _get_unprocessed(cur)
-        cur.close()
-        conn.close()
+        with db.connection() as conn, conn.cursor() as cur:
+            rows = _get_unprocessed(cur)
         if not rows:
             print("No unprocessed videos.", flush=True)
             return 0
-        for i, (vid, pod) in enumerate(rows):
-            print(f"[{i+1}/{len(rows)}] {vid} ({pod})", flush=True)
-            _process_one(vid, pod, work_dir=work_dir, prompt_set=args.prompt_set)
+        out = process_many(rows, work_dir=work_dir, prompt_set=args.prompt_set, **batch)
+        print(f"Processed {out['processed']}, failed {out['failed']}.", flush=True)
+        _sync_search_outbox()
+        _print_llm_cache_stats()
         return 0
 
     ap.print_help()
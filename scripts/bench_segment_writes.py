@@ -0,0 +1,94 @@
+"""
+Benchmark segment persistence against DATABASE_URL: row-by-row INSERT (old store path) vs multi-row
+INSERT ... VALUES (db.insert_rows) vs COPY (db.copy_rows, used by the pipeline). Writes into a TEMP copy of
+segments, so nothing is persisted.
+Usage: python scripts/bench_segment_writes.py [--rows 1500] [--rounds 3]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+_env = ROOT / ".env"
+try:
+    from dotenv import load_dotenv
+    load_dotenv(_env)
+except ImportError:
+    if _env.exists():
+        for line in _env.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                k, _, v = line.partition("=")
+                if k.strip():
+                    os.environ.setdefault(k.strip(), v.strip())
+
+
+def _fake_utterances(n: int) -> list[dict]:
+    """Utterances shaped like deepgram_client.get_utterances, ~5 s each, two speakers."""
+    words = "we scaled paid social to thirty percent of spend once creative refresh hit a two week cadence".split()
+    return [
+        {
+            "start": i * 5.0,
+            "end": i * 5.0 + 4.5,
+            "transcript": " ".join(words[(i + j) % len(words)] for j in range(18)) + f"\tline {i}\n",
+            "speaker": i % 2,
+        }
+        for i in range(n)
+    ]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark segment writes: row-by-row vs execute_values vs COPY")
+    ap.add_argument("--rows", type=int, default=1500, help="Utterances per episode (default 1500, ~2 h episode)")
+    ap.add_argument("--rounds", type=int, default=3, help="Runs per method; best is reported (default 3)")
+    args = ap.parse_args()
+    if not os.environ.get("DATABASE_URL"):
+        print("DATABASE_URL not set.", file=sys.stderr)
+        return 1
+
+    import db
+    from pipeline import SEGMENT_COLUMNS, _segment_rows
+
+    rows = _segment_rows(None, _fake_utterances(args.rows))
+    placeholders = ", ".join(["%s"] * len(SEGMENT_COLUMNS))
+
+    def row_by_row(cur) -> None:
+        for r in rows:
+            cur.execute(f"INSERT INTO bench_segments ({', '.join(SEGMENT_COLUMNS)}) VALUES ({placeholders})", r)
+
+    methods = (
+        ("row-by-row", row_by_row),
+        ("execute_values", lambda cur: db.insert_rows(cur, "bench_segments", SEGMENT_COLUMNS, rows)),
+        ("copy", lambda cur: db.copy_rows(cur, "bench_segments", SEGMENT_COLUMNS, rows)),
+    )
+    with db.connection() as conn, conn.cursor() as cur:
+        # No FK to transcriptions: transcription_id is NULL in the synthetic rows.
+        cur.execute("CREATE TEMP TABLE bench_segments (LIKE segments INCLUDING DEFAULTS)")
+        conn.commit()
+        print(f"{len(rows)} segment rows per episode, best of {args.rounds}:")
+        base = None
+        for name, fn in methods:
+            best = float("inf")
+            for _ in range(max(1, args.rounds)):
+                cur.execute("TRUNCATE bench_segments")
+                conn.commit()
+                t0 = time.perf_counter()
+                fn(cur)
+                conn.commit()
+                best = min(best, time.perf_counter() - t0)
+            cur.execute("SELECT COUNT(*) FROM bench_segments")
+            assert cur.fetchone()[0] == len(rows), name
+            base = base or best
+            print(f"  {name:<15} {best:8.3f} s  {len(rows) / best:10.0f} rows/s  ({base / best:.0f}x)")
+        cur.execute("DROP TABLE bench_segments")
+        conn.commit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Check deepgram_client.transcribe_stream against a local fake /v1/listen receiver (no Deepgram key or network):
+the upload must be chunked, arrive byte-for-byte, carry the sniffed Content-Type, and a chunk source that fails
+mid-upload must yield None.
+Usage: python scripts/check_stream_upload.py
+"""
+from __future__ import annotations
+
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+RESPONSE = b'{"results": {"channels": [{"alternatives": [{"transcript": "hello from the fake receiver"}]}]}}'
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    received: list[dict] = []
+
+    def do_POST(self) -> None:
+        body = bytearray()
+        chunks = 0
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return  # client aborted mid-upload: never a complete body
+                size = int(line.split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+                chunks += 1
+        else:
+            body += self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.received.append({
+            "path": self.path,
+            "content_type": self.headers.get("Content-Type"),
+            "chunked": chunks > 0,
+            "chunks": chunks,
+            "body": bytes(body),
+        })
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(RESPONSE)))
+            self.end_headers()
+            self.wfile.write(RESPONSE)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def main() -> int:
+    from deepgram_client import get_raw_text, transcribe_stream
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    failures: list[str] = []
+
+    def check(name: str, ok: bool) -> None:
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}", flush=True)
+        if not ok:
+            failures.append(name)
+
+    samples = {
+        "audio/webm": b"\x1a\x45\xdf\xa3" + b"w" * 300_000,
+        "audio/mp4": b"\x00\x00\x00\x20ftypM4A " + b"m" * 300_000,
+    }
+    for expected, data in samples.items():
+        _Receiver.received.clear()
+        parts = [data[i:i + 64 * 1024] for i in range(0, len(data), 64 * 1024)]
+        dg = transcribe_stream(iter(parts), api_key="test", base_url=base_url)
+        got = _Receiver.received[0] if _Receiver.received else {}
+        print(f"{expected}:", flush=True)
+        check("response parsed", get_raw_text(dg) == "hello from the fake receiver")
+        check("chunked transfer", bool(got.get("chunked")) and got.get("chunks", 0) > 1)
+        check("body intact", got.get("body") == data)
+        check("content type sniffed", got.get("content_type") == expected)
+        check("listen path", str(got.get("path", "")).startswith("/v1/listen?"))
+
+    def broken():
+        yield b"OggS" + b"o" * 1024
+        raise RuntimeError("yt-dlp exited 1")
+
+    print("source error mid-upload:", flush=True)
+    _Receiver.received.clear()
+    check("returns None", transcribe_stream(broken(), api_key="test", base_url=base_url) is None)
+    check("no complete upload received", not _Receiver.received)
+    server.shutdown()
+    print("all checks passed" if not failures else f"{len(failures)} check(s) failed", flush=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
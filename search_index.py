@@ -0,0 +1,489 @@
+"""
+Meilisearch indexing for insights: one batched add_documents per flush (a whole video, or several) instead of
+one task per document, index settings applied only when their fingerprint changes, and task UIDs tracked so
+failed indexing tasks surface as IndexingError instead of being swallowed.
+The applied-settings fingerprint is stored in .cache/meili_settings.json (per host + index).
+Env: MEILISEARCH_HOST, MEILISEARCH_API_KEY; MEILI_BATCH_SIZE (default 1000 docs per add_documents call);
+MEILI_WAIT_TASKS (default 1: wait for each flush's tasks); MEILI_TASK_TIMEOUT_SEC (default 60).
+
+Outbox: the store stage writes a search_outbox row per video in the insights transaction; drain_outbox claims
+due rows (lease + SKIP LOCKED), replaces those videos' documents from the insights table and deletes the rows,
+or reschedules them with exponential backoff. OutboxSyncer drains in a background thread (API process).
+Env: OUTBOX_BATCH_VIDEOS (default 100), OUTBOX_LEASE_SEC (300), OUTBOX_BACKOFF_SEC (10, doubled per attempt up
+to OUTBOX_MAX_BACKOFF_SEC, 900), OUTBOX_SYNC_INTERVAL_SEC (5).
+"""
+from __future__ import annotations
+
+import datetime as dt
+import decimal
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Iterable
+
+ROOT = Path(__file__).resolve().parent
+SETTINGS_STATE_PATH = ROOT / ".cache" / "meili_settings.json"
+
+INDEX_NAME = "operators_insights"
+PRIMARY_KEY = "id"
+INDEX_SETTINGS: dict[str, list[str]] = {
+    "filterableAttributes": ["podcast", "category", "video_id"],
+    "searchableAttributes": ["title", "description", "framework_markdown"],
+    "sortableAttributes": ["start_time_sec", "title", "category"],
+}
+# Row fields never sent to the index.
+EXCLUDED_FIELDS = frozenset({"source_chunk"})
+
+
+class IndexingError(RuntimeError):
+    """A Meilisearch task failed or did not finish within MEILI_TASK_TIMEOUT_SEC."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def get_client():
+    """meilisearch.Client from MEILISEARCH_HOST / MEILISEARCH_API_KEY, or None if unset or the package is missing."""
+    host = os.environ.get("MEILISEARCH_HOST")
+    key = os.environ.get("MEILISEARCH_API_KEY")
+    if not host or not key:
+        return None
+    try:
+        from meilisearch import Client as MeiliClient
+    except ImportError:
+        return None
+    return MeiliClient(host, key)
+
+
+def _field(obj: Any, *names: str) -> Any:
+    """Read a field from a meilisearch TaskInfo/Task model or (older clients) a plain dict."""
+    for n in names:
+        v = obj.get(n) if isinstance(obj, dict) else getattr(obj, n, None)
+        if v is not None:
+            return v
+    return None
+
+
+def task_uid(info: Any) -> int | None:
+    return _field(info, "task_uid", "taskUid", "uid")
+
+
+def _require_task_uid(info: Any, what: str) -> int:
+    """task_uid(info), raising IndexingError when Meilisearch returned no task to wait for."""
+    uid = task_uid(info)
+    if uid is None:
+        raise IndexingError(f"{what}: Meilisearch returned no task uid ({info!r})")
+    return uid
+
+
+def wait_for_tasks(client, uids: Iterable[int], *, timeout_sec: float | None = None) -> None:
+    """Wait for each task; raise IndexingError listing every task that failed or timed out."""
+    if timeout_sec is None:
+        timeout_sec = float(_env_int("MEILI_TASK_TIMEOUT_SEC", 60))
+    errors: list[str] = []
+    for uid in uids:
+        try:
+            task = client.wait_for_task(uid, timeout_in_ms=int(timeout_sec * 1000), interval_in_ms=100)
+        except Exception as e:
+            errors.append(f"task {uid}: {e!s}")
+            continue
+        status = _field(task, "status")
+        if status != "succeeded":
+            err = _field(task, "error") or {}
+            msg = err.get("message") if isinstance(err, dict) else str(err)
+            errors.append(f"task {uid} {status}: {msg or 'no error message'}")
+    if errors:
+        raise IndexingError("; ".join(errors))
+
+
+def settings_fingerprint(settings: dict[str, Any] | None = None) -> str:
+    data = json.dumps(settings if settings is not None else INDEX_SETTINGS, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+_settings_lock = threading.Lock()
+_settings_applied: set[tuple[str, str]] = set()
+
+
+def _load_settings_state() -> dict[str, str]:
+    try:
+        return json.loads(SETTINGS_STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def ensure_settings(client, index_name: str = INDEX_NAME, *, settings: dict[str, Any] | None = None, force: bool = False) -> bool:
+    """
+    Apply INDEX_SETTINGS (or `settings`) to the index unless the stored fingerprint for this host + index
+    already matches. Waits for the settings task; returns True if settings were sent.
+    """
+    settings = settings if settings is not None else INDEX_SETTINGS
+    fp = settings_fingerprint(settings)
+    state_key = f"{getattr(getattr(client, 'config', None), 'url', '')}|{index_name}"
+    with _settings_lock:
+        if not force and (state_key, fp) in _settings_applied:
+            return False
+        state = _load_settings_state()
+        if not force and state.get(state_key) == fp:
+            _settings_applied.add((state_key, fp))
+            return False
+        uid = task_uid(client.index(index_name).update_settings(settings))
+        if uid is not None:
+            wait_for_tasks(client, [uid])
+        state[state_key] = fp
+        try:
+            SETTINGS_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            SETTINGS_STATE_PATH.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        except OSError as e:
+            print(f"  [search] could not save settings fingerprint: {e!s}", flush=True)
+        _settings_applied.add((state_key, fp))
+        return True
+
+
+def to_document(row: dict[str, Any]) -> dict[str, Any]:
+    """Search document for an insights row (drops EXCLUDED_FIELDS)."""
+    return {k: v for k, v in row.items() if k not in EXCLUDED_FIELDS}
+
+
+class Indexer:
+    """
+    Buffer insight documents and send them as batched add_documents calls (batch_size docs each).
+    flush() returns the task UIDs it enqueued; wait() blocks on every pending task and raises IndexingError
+    if any failed. Not shared across threads: use one Indexer per worker.
+    """
+
+    def __init__(self, client, index_name: str = INDEX_NAME, *, batch_size: int | None = None):
+        self.client = client
+        self.index_name = index_name
+        self.batch_size = max(1, batch_size or _env_int("MEILI_BATCH_SIZE", 1000))
+        self._buffer: list[dict[str, Any]] = []
+        self.pending: list[int] = []
+        self.sent = 0
+
+    def add(self, rows: Iterable[dict[str, Any]]) -> None:
+        self._buffer.extend(to_document(r) for r in rows)
+
+    def flush(self) -> list[int]:
+        if not self._buffer:
+            return []
+        ensure_settings(self.client, self.index_name)
+        idx = self.client.index(self.index_name)
+        uids: list[int] = []
+        docs, self._buffer = self._buffer, []
+        for i in range(0, len(docs), self.batch_size):
+            batch = docs[i:i + self.batch_size]
+            uid = task_uid(idx.add_documents(batch, primary_key=PRIMARY_KEY))
+            self.sent += len(batch)
+            if uid is not None:
+                uids.append(uid)
+        self.pending.extend(uids)
+        return uids
+
+    def wait(self, *, timeout_sec: float | None = None) -> None:
+        uids, self.pending = self.pending, []
+        wait_for_tasks(self.client, uids, timeout_sec=timeout_sec)
+
+
+def wait_enabled() -> bool:
+    return os.environ.get("MEILI_WAIT_TASKS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def index_rows(rows: list[dict[str, Any]], *, client=None) -> int:
+    """
+    Index insights rows in one batched flush (waiting on the tasks unless MEILI_WAIT_TASKS=0).
+    Returns docs sent; 0 if Meilisearch is not configured. Raises IndexingError on failed tasks.
+    """
+    client = client or get_client()
+    if client is None or not rows:
+        return 0
+    indexer = Indexer(client)
+    indexer.add(rows)
+    indexer.flush()
+    if wait_enabled():
+        indexer.wait()
+    return indexer.sent
+
+
+# --- Outbox ---------------------------------------------------------------------------------------------------
+
+DOCUMENT_COLUMNS = (
+    "id", "video_id", "podcast", "category", "title", "description",
+    "start_time_sec", "end_time_sec", "framework_markdown",
+)
+
+
+def _jsonable(v: Any) -> Any:
+    if isinstance(v, decimal.Decimal):
+        return float(v)
+    if isinstance(v, uuid.UUID):
+        return str(v)
+    if isinstance(v, (dt.datetime, dt.date)):
+        return v.isoformat()
+    return v
+
+
+def row_to_document(row: tuple) -> dict[str, Any]:
+    """Search document from an insights row selected as DOCUMENT_COLUMNS."""
+    return {k: _jsonable(v) for k, v in zip(DOCUMENT_COLUMNS, row)}
+
+
+def enqueue(cur, video_ids: Iterable[str]) -> None:
+    """Queue videos for (re)indexing; call inside the transaction that writes their insights."""
+    from db import insert_rows
+
+    insert_rows(cur, "search_outbox", ("video_id",), [(v,) for v in dict.fromkeys(video_ids)])
+
+
+def replace_video_documents(client, video_ids: list[str], docs: list[dict[str, Any]], index_name: str = INDEX_NAME) -> None:
+    """
+    Make the index hold exactly `docs` for video_ids: delete each video's documents by filter, then add docs.
+    Tasks run in order on the index; waits for all and raises IndexingError if any failed.
+    """
+    ensure_settings(client, index_name)
+    idx = client.index(index_name)
+    uids: list[int] = []
+    for i in range(0, len(video_ids), 100):
+        ids = ", ".join(json.dumps(v) for v in video_ids[i:i + 100])
+        uid = task_uid(idx.delete_documents(filter=f"video_id IN [{ids}]"))
+        if uid is not None:
+            uids.append(uid)
+    indexer = Indexer(client, index_name)
+    indexer.add(docs)
+    uids.extend(indexer.flush())
+    wait_for_tasks(client, uids)
+
+
+def _backoff_sec(attempts: int) -> float:
+    base = float(_env_int("OUTBOX_BACKOFF_SEC", 10))
+    cap = float(_env_int("OUTBOX_MAX_BACKOFF_SEC", 900))
+    return min(cap, base * (2 ** max(0, attempts - 1)))
+
+
+def sync_outbox_once(client, *, limit: int | None = None) -> dict[str, int]:
+    """
+    Claim up to `limit` due outbox rows (leased for OUTBOX_LEASE_SEC so other syncers skip them), push the
+    current insights of those videos, then delete the rows or reschedule them with backoff.
+    No transaction is open while talking to Meilisearch. Returns {claimed, videos, docs, failed}.
+    """
+    import db
+
+    limit = limit or _env_int("OUTBOX_BATCH_VIDEOS", 100)
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE search_outbox SET attempts = attempts + 1, next_attempt_at = now() + make_interval(secs => %s)
+            WHERE id IN (
+              SELECT id FROM search_outbox WHERE next_attempt_at <= now() ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, video_id, attempts
+            """,
+            (_env_int("OUTBOX_LEASE_SEC", 300), limit),
+        )
+        claimed = cur.fetchall()
+        conn.commit()
+        if not claimed:
+            return {"claimed": 0, "videos": 0, "docs": 0, "failed": 0}
+        video_ids = sorted({r[1] for r in claimed})
+        cur.execute(
+            f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM insights WHERE video_id = ANY(%s) ORDER BY video_id",
+            (video_ids,),
+        )
+        docs = [row_to_document(r) for r in cur.fetchall()]
+
+    ids = [r[0] for r in claimed]
+    try:
+        replace_video_documents(client, video_ids, docs)
+    except Exception as e:
+        with db.connection() as conn, conn.cursor() as cur:
+            for row_id, _, attempts in claimed:
+                cur.execute(
+                    "UPDATE search_outbox SET next_attempt_at = now() + make_interval(secs => %s), last_error = %s WHERE id = %s",
+                    (_backoff_sec(attempts), str(e)[:2000], row_id),
+                )
+            conn.commit()
+        print(f"  [outbox] {len(video_ids)} videos failed (will retry): {e!s}", flush=True)
+        return {"claimed": len(ids), "videos": len(video_ids), "docs": 0, "failed": len(ids)}
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM search_outbox WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+    return {"claimed": len(ids), "videos": len(video_ids), "docs": len(docs), "failed": 0}
+
+
+def drain_outbox(client=None, *, limit: int | None = None) -> dict[str, int]:
+    """Sync batches until no outbox row is due (failed rows wait for their backoff). Returns summed counts."""
+    total = {"claimed": 0, "videos": 0, "docs": 0, "failed": 0}
+    client = client or get_client()
+    if client is None:
+        return total
+    while True:
+        out = sync_outbox_once(client, limit=limit)
+        for k in total:
+            total[k] += out[k]
+        if not out["claimed"] or out["failed"]:
+            return total
+
+
+def outbox_stats() -> dict[str, Any]:
+    """{pending, due, retrying, oldest_sec} for the search_outbox table."""
+    import db
+
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE next_attempt_at <= now()), COUNT(*) FILTER (WHERE attempts > 0),
+                   EXTRACT(EPOCH FROM now() - MIN(created_at))
+            FROM search_outbox
+            """
+        )
+        pending, due, retrying, oldest = cur.fetchone()
+    return {"pending": pending, "due": due, "retrying": retrying, "oldest_sec": round(float(oldest or 0), 1)}
+
+
+class OutboxSyncer:
+    """Background thread that drains the outbox every OUTBOX_SYNC_INTERVAL_SEC seconds until stop()."""
+
+    def __init__(self, *, interval_sec: float | None = None):
+        self.interval_sec = interval_sec if interval_sec is not None else float(_env_int("OUTBOX_SYNC_INTERVAL_SEC", 5))
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.last_run: float | None = None
+        self.last_error: str | None = None
+        self.totals = {"claimed": 0, "videos": 0, "docs": 0, "failed": 0}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-syncer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                out = drain_outbox()
+                for k in self.totals:
+                    self.totals[k] += out[k]
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"  [outbox] sync error: {e!s}", flush=True)
+            self.last_run = time.time()
+            self._stop.wait(self.interval_sec)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._thread is not None,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+            **self.totals,
+        }
+
+
+# --- Full reindex ---------------------------------------------------------------------------------------------
+
+def _index_exists(client, index_name: str) -> bool:
+    try:
+        client.get_index(index_name)
+        return True
+    except Exception:
+        return False
+
+
+def reindex_all(client=None, *, batch_size: int | None = None, max_in_flight: int = 4, progress=None) -> dict[str, Any]:
+    """
+    Rebuild INDEX_NAME from the insights table without interrupting search: stream rows through a server-side
+    cursor in batch_size pages (memory stays constant), add them to a temporary index created with
+    INDEX_SETTINGS, then swap it with the live index in one task and delete the old one.
+    At most max_in_flight add_documents tasks are queued at once. progress(dict) is called after every batch
+    with {docs, elapsed_sec, docs_per_sec, phase}. Videos touched while the rebuild ran (new insights, pending
+    outbox rows, or a store checkpoint, which also covers videos re-extracted to zero rows whose outbox row was
+    already drained into the old index) are re-queued on the outbox afterwards so the swapped-in index catches
+    up. Raises IndexingError if a create/settings/add/swap/delete call returns no task uid. Returns the final
+    progress dict.
+    """
+    import db
+
+    client = client or get_client()
+    if client is None:
+        raise ValueError("MEILISEARCH_HOST / MEILISEARCH_API_KEY not set")
+    batch_size = max(1, batch_size or _env_int("MEILI_BATCH_SIZE", 1000))
+    tmp_name = f"{INDEX_NAME}_reindex_{int(time.time())}"
+    t0 = time.monotonic()
+    state: dict[str, Any] = {"phase": "prepare", "index": tmp_name, "docs": 0, "elapsed_sec": 0.0, "docs_per_sec": 0.0}
+
+    def report(phase: str) -> None:
+        elapsed = time.monotonic() - t0
+        state.update(phase=phase, elapsed_sec=round(elapsed, 1), docs_per_sec=round(state["docs"] / elapsed, 1) if elapsed else 0.0)
+        if progress:
+            progress(dict(state))
+
+    wait_for_tasks(client, [_require_task_uid(client.create_index(tmp_name, {"primaryKey": PRIMARY_KEY}), "create_index")])
+    try:
+        wait_for_tasks(client, [_require_task_uid(client.index(tmp_name).update_settings(INDEX_SETTINGS), "update_settings")])
+        idx = client.index(tmp_name)
+        in_flight: list[int] = []
+        report("indexing")
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                # Snapshot start (transaction time) to re-queue anything written after the cursor's snapshot.
+                cur.execute("SELECT now()")
+                started_at = cur.fetchone()[0]
+            with conn.cursor(name="reindex_insights") as cur:
+                cur.itersize = batch_size
+                cur.execute(f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM insights ORDER BY video_id, id")
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    docs = [row_to_document(r) for r in rows]
+                    in_flight.append(_require_task_uid(idx.add_documents(docs, primary_key=PRIMARY_KEY), "add_documents"))
+                    if len(in_flight) >= max_in_flight:
+                        wait_for_tasks(client, [in_flight.pop(0)])
+                    state["docs"] += len(rows)
+                    report("indexing")
+            conn.commit()
+        wait_for_tasks(client, in_flight)
+
+        report("swapping")
+        if not _index_exists(client, INDEX_NAME):
+            wait_for_tasks(client, [_require_task_uid(client.create_index(INDEX_NAME, {"primaryKey": PRIMARY_KEY}), "create_index")])
+        wait_for_tasks(client, [_require_task_uid(client.swap_indexes([{"indexes": [INDEX_NAME, tmp_name]}]), "swap_indexes")])
+    except Exception:
+        try:
+            client.delete_index(tmp_name)
+        except Exception:
+            pass
+        raise
+    # tmp_name now holds the previous live documents.
+    wait_for_tasks(client, [_require_task_uid(client.delete_index(tmp_name), "delete_index")])
+    with _settings_lock:
+        _settings_applied.add((f"{getattr(getattr(client, 'config', None), 'url', '')}|{INDEX_NAME}", settings_fingerprint()))
+
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO search_outbox (video_id)
+            SELECT video_id FROM insights WHERE created_at >= %(since)s
+            UNION
+            SELECT video_id FROM search_outbox WHERE created_at >= %(since)s
+            UNION
+            SELECT video_id FROM video_pipeline_state WHERE stage = 'indexed' AND updated_at >= %(since)s
+            """,
+            {"since": started_at - dt.timedelta(minutes=5)},
+        )
+        state["requeued_videos"] = cur.rowcount
+        conn.commit()
+    report("done")
+    return dict(state)
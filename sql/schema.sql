@@ -28,6 +28,9 @@ CREATE TABLE IF NOT EXISTS transcriptions (
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- Full Deepgram response (gzip-compressed JSON) so insights can be re-extracted without re-transcribing
+ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS deepgram_json_gz BYTEA;
+
 CREATE INDEX IF NOT EXISTS idx_transcriptions_video_id ON transcriptions(video_id);
 
 -- Segments: time-bounded utterances (optional; for diarization/segments)
@@ -91,3 +94,80 @@ CREATE TABLE IF NOT EXISTS seed_links (
 );
 CREATE INDEX IF NOT EXISTS idx_seed_links_video_id ON seed_links(video_id);
 CREATE INDEX IF NOT EXISTS idx_seed_links_podcast ON seed_links(podcast);
+
+-- Search outbox: videos whose insights must be (re)pushed to Meilisearch. Written in the same transaction as
+-- the insights rows; drained by search_index.drain_outbox (API background syncer or pipeline --sync-outbox).
+CREATE TABLE IF NOT EXISTS search_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  video_id TEXT NOT NULL,
+  attempts INT NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  last_error TEXT,
+  created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_search_outbox_next_attempt_at ON search_outbox(next_attempt_at);
+
+-- Pipeline jobs: durable work queue shared by every API process / worker node (jobs.py).
+-- Parent jobs (sync, process-new, backfill, reextract) expand into one child job per video and finish when all
+-- children have; workers claim rows with FOR UPDATE SKIP LOCKED and hold a lease renewed while they run.
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  parent_id UUID REFERENCES pipeline_jobs(id) ON DELETE CASCADE,
+  type TEXT NOT NULL,  -- sync | process-new | backfill | reextract | reindex | process | reextract-video
+  video_id TEXT,
+  podcast TEXT,
+  payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+  status TEXT NOT NULL DEFAULT 'queued',  -- queued | running | waiting (children) | done | error
+  attempts INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 3,
+  run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_by TEXT,
+  lease_expires_at TIMESTAMPTZ,
+  progress JSONB,
+  result JSONB,
+  error TEXT,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  updated_at TIMESTAMPTZ DEFAULT now(),
+  finished_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_claim ON pipeline_jobs(status, run_after);
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_parent_id ON pipeline_jobs(parent_id);
+-- At most one queued/running job per (type, video): re-enqueueing a video already in flight is a no-op.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pipeline_jobs_active_video ON pipeline_jobs(type, video_id)
+  WHERE status IN ('queued', 'running') AND video_id IS NOT NULL;
+
+-- Per-video pipeline checkpoint: last completed stage plus the intermediate artifacts needed to resume after it
+-- (pipeline._resume). new -> downloaded -> transcribed (transcriptions row) -> chunked (chunks) -> extracted
+-- (insights) -> enriched (insight_rows) -> indexed (insights stored and queued for search; artifacts cleared).
+CREATE TABLE IF NOT EXISTS video_pipeline_state (
+  video_id TEXT PRIMARY KEY REFERENCES videos(video_id) ON DELETE CASCADE,
+  stage TEXT NOT NULL DEFAULT 'new',
+  prompt_set TEXT,
+  chunks JSONB,
+  insights JSONB,
+  insight_rows JSONB,
+  error TEXT,
+  failed_stage TEXT,
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_video_pipeline_state_stage ON video_pipeline_state(stage);
+-- Existing data: videos with insights are done; transcribed videos without insights resume at extraction.
+INSERT INTO video_pipeline_state (video_id, stage)
+SELECT DISTINCT video_id, 'indexed' FROM insights
+ON CONFLICT (video_id) DO NOTHING;
+INSERT INTO video_pipeline_state (video_id, stage)
+SELECT DISTINCT video_id, 'transcribed' FROM transcriptions
+ON CONFLICT (video_id) DO NOTHING;
+
+-- YouTube channels polled by fetch-new: cached channel ID and the newest published_at fetched (watermark).
+-- Incremental fetches page the uploads playlist only back to the watermark.
+CREATE TABLE IF NOT EXISTS youtube_channels (
+  handle TEXT PRIMARY KEY,
+  podcast TEXT NOT NULL,
+  channel_id TEXT,
+  published_watermark TIMESTAMPTZ,
+  last_fetched_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+-- ETag of the uploads playlist's first page: sent as If-None-Match, an unchanged channel comes back 304.
+ALTER TABLE youtube_channels ADD COLUMN IF NOT EXISTS uploads_etag TEXT;
@@ -0,0 +1,146 @@
+"""
+Local insight-to-transcript alignment: find when an insight is discussed by matching its words against the
+Deepgram utterances (from deepgram_client.get_utterances), without an LLM call.
+Build one TranscriptIndex per episode, then call align() per insight; low-confidence results should fall back
+to insight_extractor.extract_timestamps.
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Iterable
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Common words that carry no position signal on their own (still used inside shingles).
+_STOPWORDS = frozenset(
+    """a an and are as at be but by do for from have he her his i if in is it its me my no not of on or our she so
+    that the their them then there they this to up us was we were what when which who will with you your just like
+    know yeah really think going get got very can all about would could one thing things kind sort lot also um uh""".split()
+)
+
+SHINGLE_SIZE = 3
+# Longest stretch of transcript an insight may span (seconds).
+MAX_SPAN_SEC = 180.0
+# Below this coverage, callers should use the LLM fallback (ALIGN_MIN_CONFIDENCE env overrides).
+try:
+    MIN_CONFIDENCE = float(os.environ.get("ALIGN_MIN_CONFIDENCE", "0.45"))
+except ValueError:
+    MIN_CONFIDENCE = 0.45
+# Texts with fewer features than this can't reach full confidence (a one-word title matching anywhere is weak).
+MIN_FEATURES = 6
+# align_best keeps an earlier (more specific) text's match unless a later one is this much more confident.
+PREFER_MARGIN = 0.15
+
+
+def _words(text: str) -> list[str]:
+    return _WORD_RE.findall((text or "").lower())
+
+
+def _features(words: list[str], n: int = SHINGLE_SIZE) -> set[str]:
+    """Content unigrams plus word n-gram shingles (joined with spaces)."""
+    feats = {w for w in words if w not in _STOPWORDS and len(w) > 1}
+    for i in range(len(words) - n + 1):
+        feats.add(" ".join(words[i:i + n]))
+    return feats
+
+
+class TranscriptIndex:
+    """
+    Per-episode index over utterances: start/end times sorted by start, and postings from each feature
+    (content word or word shingle) to the utterance positions that contain it, with IDF weights.
+    """
+
+    def __init__(self, utterances: Iterable[dict[str, Any]], *, shingle_size: int = SHINGLE_SIZE):
+        rows = [
+            u for u in utterances
+            if u.get("start") is not None and u.get("end") is not None and (u.get("transcript") or "").strip()
+        ]
+        rows.sort(key=lambda u: float(u["start"]))
+        self.shingle_size = shingle_size
+        self.starts: list[float] = [float(u["start"]) for u in rows]
+        self.ends: list[float] = [float(u["end"]) for u in rows]
+        self.postings: dict[str, list[int]] = {}
+        for i, u in enumerate(rows):
+            for f in _features(_words(u["transcript"]), shingle_size):
+                self.postings.setdefault(f, []).append(i)
+        n = max(1, len(rows))
+        self._max_idf = math.log(n + 1)
+        self.idf: dict[str, float] = {f: math.log((n + 1) / (len(p) + 0.5)) for f, p in self.postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _weight(self, f: str) -> float:
+        # Shingles count double: a matching 3-word run is much stronger evidence than one word.
+        w = self.idf.get(f, self._max_idf)
+        return w * 2 if " " in f else w
+
+    def align(self, text: str, *, max_span_sec: float = MAX_SPAN_SEC) -> tuple[float, float, float] | None:
+        """
+        Locate text in the transcript. Returns (start_sec, end_sec, confidence) or None if nothing matched.
+        confidence (0..1) is the weighted share of the text's features found inside the best time window,
+        scaled down for texts with fewer than MIN_FEATURES features.
+        """
+        feats = _features(_words(text), self.shingle_size)
+        if not feats or not self.starts:
+            return None
+        total = sum(self._weight(f) for f in feats)
+        hits: dict[int, list[str]] = {}
+        for f in feats:
+            for i in self.postings.get(f, ()):
+                hits.setdefault(i, []).append(f)
+        if not hits:
+            return None
+
+        # Slide a window over the matching utterances (sorted by start) no longer than max_span_sec,
+        # keeping the weighted union of matched features.
+        cand = sorted(hits)
+        counts: Counter[str] = Counter()
+        covered = 0.0
+        best: tuple[float, int, int] = (0.0, 0, 0)
+        lo = 0
+        for hi, i in enumerate(cand):
+            for f in hits[i]:
+                if counts[f] == 0:
+                    covered += self._weight(f)
+                counts[f] += 1
+            while self.starts[i] - self.starts[cand[lo]] > max_span_sec:
+                for f in hits[cand[lo]]:
+                    counts[f] -= 1
+                    if counts[f] == 0:
+                        covered -= self._weight(f)
+                lo += 1
+            if covered > best[0] + 1e-9:
+                best = (covered, lo, hi)
+        covered, lo, hi = best
+
+        # Trim edge utterances that only add stray common words (keep >= 90% of the window's coverage).
+        def union_weight(a: int, b: int) -> float:
+            return sum(self._weight(f) for f in {f for i in cand[a:b + 1] for f in hits[i]})
+
+        while lo < hi and union_weight(lo + 1, hi) >= 0.9 * covered:
+            lo += 1
+        while hi > lo and union_weight(lo, hi - 1) >= 0.9 * covered:
+            hi -= 1
+        covered = union_weight(lo, hi)
+        first, last = cand[lo], cand[hi]
+        confidence = min(1.0, covered / total) if total > 0 else 0.0
+        confidence *= min(1.0, len(feats) / MIN_FEATURES)
+        return (round(self.starts[first], 3), round(self.ends[last], 3), round(confidence, 3))
+
+    def align_best(self, texts: Iterable[str], *, max_span_sec: float = MAX_SPAN_SEC) -> tuple[float, float, float] | None:
+        """
+        align() each non-empty text, most specific first (e.g. quote/description, then title). The first match
+        is kept unless a later text is clearly more confident (by PREFER_MARGIN).
+        """
+        best = None
+        for t in texts:
+            if not (t or "").strip():
+                continue
+            r = self.align(t, max_span_sec=max_span_sec)
+            if r and (best is None or r[2] > best[2] + PREFER_MARGIN):
+                best = r
+        return best
@@ -5,11 +5,14 @@ Tag each video with podcast: 9operators | marketing_operator | finance_operators
 """
 from __future__ import annotations
 
+import codecs
 import csv
 import os
 import re
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Iterable, Iterator
 
 # YouTube @handles for fetch-new (override via YOUTUBE_CHANNEL_<PODCAST> env, e.g. YOUTUBE_CHANNEL_FINANCE_OPERATORS)
 DEFAULT_CHANNEL_HANDLES = {
@@ -18,6 +21,11 @@ DEFAULT_CHANNEL_HANDLES = {
     "finance_operators": "FinanceOperators",
 }
 
+# Max items per playlistItems.list page and IDs per videos.list call (API limit).
+PAGE_SIZE = 50
+# Incremental fetches re-read uploads this far behind the watermark (uploads made public late, premieres).
+WATERMARK_OVERLAP = timedelta(hours=24)
+
 # CSV seed paths (Windows); override via env or pass to functions
 DEFAULT_CSV_PATHS = {
     "9operators": os.path.join(os.environ.get("USERPROFILE", ""), "Downloads", "Operators Podcast Video Youtube Links.csv"),
@@ -56,6 +64,69 @@ def _infer_podcast_from_filename(path: str) -> str:
     return "9operators"
 
 
+def iter_csv_rows(
+    lines: Iterable[str],
+    *,
+    podcast: str,
+    min_duration_sec: int = 300,
+    seen: set[str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Parse seed-list CSV lines one row at a time. Format: col 1 = URL, col 3 = duration (e.g. 1:27:30), col 4 = title.
+    Dedupes by video_id against `seen` (updated in place; pass one set to dedupe across files).
+    Skips duration under min_duration_sec.
+    """
+    seen = set() if seen is None else seen
+    for row in csv.reader(lines):
+        if len(row) < 1:
+            continue
+        url = (row[0] or "").strip()
+        vid = _extract_video_id(url)
+        if not vid or vid in seen:
+            continue
+        seen.add(vid)
+        duration_str = (row[2] if len(row) > 2 else "") or ""
+        duration_sec = _parse_duration(duration_str)
+        if duration_sec is not None and duration_sec < min_duration_sec:
+            continue
+        title = (row[3] if len(row) > 3 else "") or ""
+        yield {
+            "video_id": vid,
+            "title": title,
+            "duration_seconds": duration_sec,
+            "podcast": podcast,
+            "url": url or "",
+        }
+
+
+def iter_csv_stream(
+    stream: BinaryIO,
+    *,
+    podcast: str,
+    min_duration_sec: int = 300,
+    seen: set[str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    iter_csv_rows over a binary stream (e.g. an upload's file object), decoded as UTF-8 line by line, so memory
+    stays flat however large the export is. The stream is left open. Only iteration is needed (no TextIOWrapper:
+    SpooledTemporaryFile lacks readable() before Python 3.11).
+    """
+    lines = codecs.iterdecode(stream, "utf-8-sig", errors="replace")
+    yield from iter_csv_rows(lines, podcast=podcast, min_duration_sec=min_duration_sec, seen=seen)
+
+
+def batched(rows: Iterable[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    """Group rows into lists of at most size, e.g. to feed a bulk upsert."""
+    batch: list[dict[str, Any]] = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def load_from_csv(
     csv_path: str,
     *,
@@ -63,38 +134,16 @@ def load_from_csv(
     min_duration_sec: int = 300,
 ) -> list[dict[str, Any]]:
     """
-    Load video list from a CSV. Format: col 1 = URL, col 3 = duration (e.g. 1:27:30), col 4 = title.
-    Dedupes by video_id. Optionally skips duration under min_duration_sec.
+    Load video list from a CSV file (see iter_csv_rows). Dedupes by video_id.
+    Optionally skips duration under min_duration_sec.
     """
     if podcast is None:
         podcast = _infer_podcast_from_filename(csv_path)
-    out: list[dict[str, Any]] = []
-    seen: set[str] = set()
     path = Path(csv_path)
     if not path.exists():
-        return out
+        return []
     with open(path, newline="", encoding="utf-8", errors="replace") as f:
-        for row in csv.reader(f):
-            if len(row) < 1:
-                continue
-            url = (row[0] or "").strip()
-            vid = _extract_video_id(url)
-            if not vid or vid in seen:
-                continue
-            seen.add(vid)
-            duration_str = (row[2] if len(row) > 2 else "") or ""
-            duration_sec = _parse_duration(duration_str)
-            if duration_sec is not None and duration_sec < min_duration_sec:
-                continue
-            title = (row[3] if len(row) > 3 else "") or ""
-            out.append({
-                "video_id": vid,
-                "title": title,
-                "duration_seconds": duration_sec,
-                "podcast": podcast,
-                "url": url or "",
-            })
-    return out
+        return list(iter_csv_rows(f, podcast=podcast, min_duration_sec=min_duration_sec))
 
 
 def load_all_seed_csvs(
@@ -127,11 +176,15 @@ def get_channel_handle(podcast: str) -> str | None:
     return (DEFAULT_CHANNEL_HANDLES or {}).get(podcast or "")
 
 
-def resolve_channel_id(for_handle: str, api_key: str | None = None) -> str | None:
-    """
-    Resolve a YouTube @handle (e.g. 'Operators9', 'MarketingOperators') to channel ID.
-    Use fetch_channel_videos(channel_id, podcast=...) after this.
-    """
+# One discovery client per API key for the process (build() parses the discovery document); requests run on
+# a per-thread httplib2.Http because Http objects are not thread-safe.
+_clients: dict[str, Any] = {}
+_clients_lock = threading.Lock()
+_local = threading.local()
+
+
+def _youtube(api_key: str | None = None):
+    """Shared YouTube Data API v3 client, or None if google-api-python-client or the API key is missing."""
     try:
         from googleapiclient.discovery import build
     except ImportError:
@@ -139,14 +192,181 @@ def resolve_channel_id(for_handle: str, api_key: str | None = None) -> str | Non
     api_key = api_key or os.environ.get("YOUTUBE_API_KEY")
     if not api_key:
         return None
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = build("youtube", "v3", developerKey=api_key, cache_discovery=False)
+        return _clients[api_key]
+
+
+def _execute(req, *, etag: str | None = None) -> dict[str, Any] | None:
+    """
+    Execute an API request on this thread's connection. With etag, sends If-None-Match and returns None
+    when YouTube answers 304 Not Modified.
+    """
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    http = getattr(_local, "http", None)
+    if http is None:
+        http = _local.http = httplib2.Http(timeout=60)
+    if etag:
+        req.headers["If-None-Match"] = etag
+    try:
+        return req.execute(http=http, num_retries=2)
+    except HttpError as e:
+        if etag and getattr(e.resp, "status", None) == 304:
+            return None
+        raise
+
+
+# @handle -> channel ID, for the life of the process (pipeline._fetch_new also persists it in youtube_channels).
+_channel_ids: dict[str, str] = {}
+
+
+def resolve_channel_id(for_handle: str, api_key: str | None = None, *, yt=None) -> str | None:
+    """
+    Resolve a YouTube @handle (e.g. 'Operators9', 'MarketingOperators') to channel ID (cached per process).
+    Use fetch_channel_videos(channel_id, podcast=...) after this.
+    """
     handle = (for_handle or "").strip().lstrip("@")
     if not handle:
         return None
-    yt = build("youtube", "v3", developerKey=api_key)
-    req = yt.channels().list(part="id", forHandle=handle)
-    res = req.execute()
+    if handle in _channel_ids:
+        return _channel_ids[handle]
+    yt = yt or _youtube(api_key)
+    if yt is None:
+        return None
+    res = _execute(yt.channels().list(part="id", forHandle=handle))
     items = res.get("items") or []
-    return items[0]["id"] if items else None
+    if not items:
+        return None
+    _channel_ids[handle] = items[0]["id"]
+    return items[0]["id"]
+
+
+def uploads_playlist_id(channel_id: str) -> str:
+    """The channel's "uploads" playlist (UC... -> UU...), same as channels.list contentDetails.relatedPlaylists.uploads."""
+    return "UU" + channel_id[2:] if channel_id.startswith("UC") else channel_id
+
+
+def _parse_published(v: Any) -> datetime | None:
+    """ISO 8601 string (YouTube's '...Z') or datetime -> aware datetime."""
+    if v is None or isinstance(v, datetime):
+        return v
+    try:
+        dt = datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def list_upload_ids(
+    channel_id: str,
+    *,
+    since: datetime | str | None = None,
+    max_results: int | None = None,
+    etag: str | None = None,
+    yt=None,
+    api_key: str | None = None,
+) -> tuple[list[str] | None, str | None]:
+    """
+    Video IDs from the channel's uploads playlist, newest first (playlistItems.list, 1 quota unit per page of 50),
+    and the first page's ETag. Pages until an upload older than `since` (minus WATERMARK_OVERLAP, for late-public /
+    scheduled uploads) or max_results IDs; since=None and max_results=None walk the whole history.
+    etag = the first page's ETag from the previous fetch: if that page is unchanged (304) returns (None, etag).
+    """
+    yt = yt or _youtube(api_key)
+    if yt is None:
+        return [], None
+    cutoff = _parse_published(since)
+    if cutoff is not None:
+        cutoff -= WATERMARK_OVERLAP
+    ids: list[str] = []
+    token = None
+    first_etag = None
+    while True:
+        req = yt.playlistItems().list(
+            part="contentDetails",
+            playlistId=uploads_playlist_id(channel_id),
+            maxResults=PAGE_SIZE,
+            pageToken=token,
+        )
+        res = _execute(req, etag=etag if token is None else None)
+        if res is None:
+            return None, etag
+        if token is None:
+            first_etag = res.get("etag")
+        reached = False
+        for it in res.get("items") or []:
+            cd = it.get("contentDetails") or {}
+            published = _parse_published(cd.get("videoPublishedAt"))
+            if published is None:
+                continue  # private or deleted upload
+            if cutoff is not None and published < cutoff:
+                reached = True
+                break
+            ids.append(cd["videoId"])
+            if max_results is not None and len(ids) >= max_results:
+                reached = True
+                break
+        token = res.get("nextPageToken")
+        if reached or not token:
+            return ids, first_etag
+
+
+def fetch_video_details(
+    video_ids: list[str],
+    *,
+    podcast: str,
+    channel_id: str | None = None,
+    yt=None,
+    api_key: str | None = None,
+) -> list[dict[str, Any]]:
+    """Title, duration and publish time for video_ids via videos.list, PAGE_SIZE IDs (1 quota unit) per call."""
+    yt = yt or _youtube(api_key)
+    if yt is None:
+        return []
+    out: list[dict[str, Any]] = []
+    for i in range(0, len(video_ids), PAGE_SIZE):
+        vres = _execute(yt.videos().list(part="snippet,contentDetails", id=",".join(video_ids[i : i + PAGE_SIZE])))
+        for it in (vres.get("items") or []):
+            sn = it.get("snippet") or {}
+            cd = it.get("contentDetails") or {}
+            out.append({
+                "video_id": it.get("id"),
+                "title": sn.get("title") or "",
+                "duration_seconds": _parse_iso8601_duration(cd.get("duration") or ""),
+                "channel_id": channel_id or sn.get("channelId"),
+                "podcast": podcast,
+                "published_at": sn.get("publishedAt"),  # ISO 8601; pass through for DB TIMESTAMPTZ
+            })
+    return out
+
+
+def fetch_channel_update(
+    channel_id: str,
+    *,
+    podcast: str,
+    api_key: str | None = None,
+    max_results: int | None = 50,
+    since: datetime | str | None = None,
+    etag: str | None = None,
+) -> dict[str, Any]:
+    """
+    Fetch a channel's uploads, newest first, via Data API v3: the uploads playlist (paged) and videos.list
+    for details, ~1 quota unit per 50 videos. since = the newest published_at already stored (watermark):
+    only newer uploads are fetched. max_results=None with since=None fetches the full history.
+    etag = uploads ETag from the previous fetch; an unchanged playlist costs one 304 round trip.
+    Returns {"videos": [...], "etag": str | None, "not_modified": bool}.
+    """
+    yt = _youtube(api_key)
+    if yt is None:
+        return {"videos": [], "etag": None, "not_modified": False}
+    vid_ids, new_etag = list_upload_ids(channel_id, since=since, max_results=max_results, etag=etag, yt=yt)
+    if vid_ids is None:
+        return {"videos": [], "etag": etag, "not_modified": True}
+    videos = fetch_video_details(vid_ids, podcast=podcast, channel_id=channel_id, yt=yt) if vid_ids else []
+    return {"videos": videos, "etag": new_etag, "not_modified": False}
 
 
 def fetch_channel_videos(
@@ -154,53 +374,22 @@ def fetch_channel_videos(
     *,
     podcast: str,
     api_key: str | None = None,
-    max_results: int = 50,
+    max_results: int | None = 50,
+    since: datetime | str | None = None,
 ) -> list[dict[str, Any]]:
     """
-    Fetch recent videos from a YouTube channel via Data API v3.
+    Fetch a channel's uploads (see fetch_channel_update), without conditional requests.
     api_key from YOUTUBE_API_KEY env if not passed.
     For 9 Operators use channel from resolve_channel_id('Operators9');
     Marketing Operator: resolve_channel_id('MarketingOperators').
     """
-    try:
-        from googleapiclient.discovery import build
-    except ImportError:
-        return []
-    api_key = api_key or os.environ.get("YOUTUBE_API_KEY")
-    if not api_key:
-        return []
-    yt = build("youtube", "v3", developerKey=api_key)
-    req = yt.search().list(
-        part="id,snippet",
-        channelId=channel_id,
-        type="video",
-        order="date",
-        maxResults=max_results,
-    )
-    res = req.execute()
-    out: list[dict[str, Any]] = []
-    vid_ids = [e["id"]["videoId"] for e in (res.get("items") or []) if "videoId" in e.get("id", {})]
-    if not vid_ids:
-        return out
-    # get duration from videos.list
-    vreq = yt.videos().list(part="snippet,contentDetails", id=",".join(vid_ids))
-    vres = vreq.execute()
-    for it in (vres.get("items") or []):
-        vid = it.get("id")
-        sn = it.get("snippet") or {}
-        cd = it.get("contentDetails") or {}
-        dur_iso = cd.get("duration") or ""
-        sec = _parse_iso8601_duration(dur_iso)
-        published_at = sn.get("publishedAt")  # ISO 8601; pass through for DB TIMESTAMPTZ
-        out.append({
-            "video_id": vid,
-            "title": sn.get("title") or "",
-            "duration_seconds": sec,
-            "channel_id": channel_id,
-            "podcast": podcast,
-            "published_at": published_at,
-        })
-    return out
+    return fetch_channel_update(channel_id, podcast=podcast, api_key=api_key, max_results=max_results, since=since)["videos"]
+
+
+def newest_published_at(videos: list[dict[str, Any]]) -> datetime | None:
+    """Latest published_at among fetched videos: the channel's next watermark."""
+    times = [t for t in (_parse_published(v.get("published_at")) for v in videos) if t is not None]
+    return max(times) if times else None
 
 
 def _parse_iso8601_duration(s: str) -> int | None: